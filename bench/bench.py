@@ -0,0 +1,258 @@
+"""Times the imeter and mldemo scripts on a synthetic data set
+
+Every stage runs as its own process in a work directory, the way the
+READMEs run them, and is timed by wall clock. Peak memory (max RSS) comes
+from os.wait4() for that process alone; since Linux counts the parent's RSS
+at fork towards it, this script keeps itself small (no numpy, and the data
+is made by synth.py in a subprocess). Results, with the versions and
+sizes used, are written as JSON. Given a baseline JSON from an earlier run,
+stages that got slower or bigger than the tolerance allows are reported and
+the exit status is 1.
+"""
+
+import argparse
+import importlib.metadata
+import importlib.util
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+def stages(arg, data):
+	"""Returns (name, argv, stdout, inputs) for each stage, in order"""
+	im = lambda script: os.path.join(ROOT, 'imeter', script)
+	ml = lambda script: os.path.join(ROOT, 'mldemo', script)
+	genome = data['genome.fa.gz']
+	gff = data['anno.gff.gz']
+	n = str(arg.sites)
+	seed = ['--seed', str(arg.seed)]
+	out = [
+		('extract.cold', [im('extract-introns.py'), genome, gff], 'introns.fa',
+			[genome, gff]),
+		('extract.warm', [im('extract-introns.py'), genome, gff], 'introns.fa',
+			[genome, gff]),
+		('extract.exons', [im('extract-intron-exon.py'), genome, gff],
+			'intron-exon.txt', [genome, gff]),
+		('isplitter.prox', [im('isplitter.py'), 'introns.fa', '400'], 'prox.fa',
+			['introns.fa']),
+		('isplitter.dist', [im('isplitter.py'), 'introns.fa', '400', '--high'],
+			'dist.fa', ['introns.fa']),
+	]
+	for k in arg.k:
+		out.append((f'kmercount.k{k}', [im('kmercount.py'), 'introns.fa',
+			str(k), '--prob'], f'introns.k{k}', ['introns.fa']))
+	out += [
+		('kmercount.prox', [im('kmercount.py'), 'prox.fa', '5', '--prob'],
+			'prox.k5', ['prox.fa']),
+		('kmercount.dist', [im('kmercount.py'), 'dist.fa', '5', '--prob'],
+			'dist.k5', ['dist.fa']),
+		('kmercompare', [im('kmercompare.py'), 'prox.k5', 'dist.k5'],
+			'compare.txt', ['prox.k5', 'dist.k5']),
+		('splices', [ml('splices.py'), 'introns.fa', '--limit', n] + seed,
+			None, ['introns.fa']),
+		('decoy-splices', [ml('decoy-splices.py'), 'introns.fa', n, '10',
+			'--donor'] + seed, 'don.decoy.txt', ['introns.fa']),
+		('random-splices', [ml('random-splices.py'), n, '10', '--donor'] + seed,
+			'don.random.txt', []),
+		('splitter.don', [ml('splitter.py'), 'don.txt', '2', 'don'], None,
+			['don.txt']),
+		('splitter.decoy', [ml('splitter.py'), 'don.decoy.txt', '2',
+			'don.decoy'], None, ['don.decoy.txt']),
+		('pwm-maker', [ml('pwm-maker.py'), 'don.0.txt'], 'don.0.pwm',
+			['don.0.txt']),
+		('pwm-maker.decoy', [ml('pwm-maker.py'), 'don.decoy.0.txt'],
+			'don.decoy.0.pwm', ['don.decoy.0.txt']),
+		('pwm-tester', [ml('pwm-tester.py'), 'don.0.pwm', 'don.decoy.0.pwm',
+			'don.1.txt', 'don.decoy.1.txt'], 'pwm-test.txt',
+			['don.1.txt', 'don.decoy.1.txt']),
+		('exon-intron.exons', [ml('exon-intron.py'), data['cds.fa.gz'], n]
+			+ seed, 'exons.txt', [data['cds.fa.gz']]),
+		('exon-intron.introns', [ml('exon-intron.py'), 'introns.fa', n,
+			'--introns'] + seed, 'introns.txt', ['introns.fa']),
+		('splitter.exons', [ml('splitter.py'), 'exons.txt', '2', 'exons'], None,
+			['exons.txt']),
+		('splitter.introns', [ml('splitter.py'), 'introns.txt', '2',
+			'introns'], None, ['introns.txt']),
+		('kmer-maker', [ml('kmer-maker.py'), 'exons.0.txt', 'introns.0.txt',
+			'4'], 'exon-intron.kmer', ['exons.0.txt', 'introns.0.txt']),
+		('kmer-tester', [ml('kmer-tester.py'), 'exon-intron.kmer',
+			'exons.1.txt', 'introns.1.txt'], 'kmer-test.txt',
+			['exons.1.txt', 'introns.1.txt']),
+		('mlp.encode', ['-c', 'import sys; sys.path.insert(0, sys.argv[1]); '
+			'import mlp; [mlp.ntencoder(f) for f in sys.argv[2:]]',
+			os.path.join(ROOT, 'mldemo'), 'don.txt', 'don.decoy.txt'], None,
+			['don.txt', 'don.decoy.txt']),
+	]
+	if not arg.no_mlp:
+		out.append(('mlp.train', [ml('mlp.py'), 'don.txt', 'don.decoy.txt',
+			'40', '1', '--epochs', str(arg.epochs), '--xvalid', '2'] + seed,
+			'mlp.txt', ['don.txt', 'don.decoy.txt']))
+	return out
+
+def run_stage(argv, stdout, workdir):
+	"""Runs one command, returning (seconds, peak RSS in MB)"""
+	out = open(os.path.join(workdir, stdout), 'wb') if stdout else \
+		subprocess.DEVNULL
+	with tempfile.TemporaryFile() as err:
+		try:
+			t0 = time.perf_counter()
+			proc = subprocess.Popen([sys.executable] + argv, cwd=workdir,
+				stdout=out, stderr=err)
+			_, status, usage = os.wait4(proc.pid, 0)
+			elapsed = time.perf_counter() - t0
+			proc.returncode = os.waitstatus_to_exitcode(status)
+		finally:
+			if stdout: out.close()
+		if proc.returncode != 0:
+			err.seek(0)
+			raise RuntimeError(f'{" ".join(argv)} failed\n'
+				+ err.read().decode(errors='replace'))
+	return elapsed, usage.ru_maxrss / 1024 # KB on Linux
+
+def version(package):
+	try: return importlib.metadata.version(package)
+	except importlib.metadata.PackageNotFoundError: return None
+
+def size(paths, workdir):
+	return sum(os.path.getsize(os.path.join(workdir, p)) for p in paths)
+
+def git_commit():
+	try:
+		return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+			capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def compare(results, baseline, tolerance):
+	"""Prints stages slower or bigger than the baseline, returns how many"""
+	old = {s['name']: s for s in baseline['stages']}
+	bad = 0
+	print('stage', 'seconds', 'baseline', 'ratio', 'rss_mb', 'baseline',
+		'ratio', sep='\t')
+	for s in results['stages']:
+		if s['name'] not in old: continue
+		o = old[s['name']]
+		t = s['seconds'] / o['seconds'] if o['seconds'] else 1
+		m = s['max_rss_mb'] / o['max_rss_mb'] if o['max_rss_mb'] else 1
+		flag = t > 1 + tolerance or m > 1 + tolerance
+		bad += flag
+		print(s['name'], f"{s['seconds']:.3f}", f"{o['seconds']:.3f}",
+			f'{t:.2f}', f"{s['max_rss_mb']:.1f}", f"{o['max_rss_mb']:.1f}",
+			f'{m:.2f}', 'REGRESSION' if flag else '', sep='\t')
+	return bad
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+		description='benchmark the pipeline on a synthetic genome')
+	parser.add_argument('--workdir', default='bench-work', metavar='<path>',
+		help='where data and outputs go [%(default)s]')
+	parser.add_argument('--chroms', type=int, default=5, metavar='<int>',
+		help='synthetic chromosomes [%(default)i]')
+	parser.add_argument('--length', type=int, default=1000000,
+		metavar='<int>', help='length of each chromosome [%(default)i]')
+	parser.add_argument('--seed', type=int, default=1, metavar='<int>',
+		help='seed for the data and every seeded stage [%(default)i]')
+	parser.add_argument('--k', type=int, nargs='+', default=[3, 5, 8],
+		metavar='<int>', help='kmercount.py sizes of k [3 5 8]')
+	parser.add_argument('--sites', type=int, default=20000, metavar='<int>',
+		help='splice sites and windows sampled [%(default)i]')
+	parser.add_argument('--epochs', type=int, default=5, metavar='<int>',
+		help='mlp.py training epochs [%(default)i]')
+	parser.add_argument('--no-mlp', action='store_true',
+		help='skip mlp.py training')
+	parser.add_argument('--repeat', type=int, default=1, metavar='<int>',
+		help='runs of each stage, the fastest is kept [%(default)i]')
+	parser.add_argument('--only', metavar='<regex>',
+		help='time only stages matching this (others still run once)')
+	parser.add_argument('--json', default='bench.json', metavar='<path>',
+		help='results file [%(default)s]')
+	parser.add_argument('--baseline', metavar='<path>',
+		help='earlier results to compare against')
+	parser.add_argument('--tolerance', type=float, default=0.25,
+		metavar='<float>', help='allowed fractional slowdown or growth '
+		'[%(default)g]')
+	arg = parser.parse_args(argv)
+	if not 1 <= arg.chroms <= 5: parser.error('--chroms must be 1 to 5')
+	if not arg.no_mlp and importlib.util.find_spec('torch') is None:
+		print('torch not found, skipping mlp.train', file=sys.stderr)
+		arg.no_mlp = True
+
+	# data is made once per seed and size, then reused
+	name = f'data-{arg.chroms}x{arg.length}-s{arg.seed}'
+	datadir = os.path.join(arg.workdir, name)
+	t0 = time.perf_counter()
+	if not os.path.exists(os.path.join(datadir, 'introns.fa.gz')):
+		subprocess.run([sys.executable, os.path.join(HERE, 'synth.py'),
+			datadir + '.tmp', '--chroms', str(arg.chroms), '--length',
+			str(arg.length), '--seed', str(arg.seed)], check=True)
+		shutil.rmtree(datadir, ignore_errors=True)
+		os.rename(datadir + '.tmp', datadir)
+	synth_seconds = time.perf_counter() - t0
+	data = {f: os.path.abspath(os.path.join(datadir, f)) for f in
+		('genome.fa.gz', 'anno.gff.gz', 'cds.fa.gz', 'introns.fa.gz')}
+	workdir = os.path.join(arg.workdir, 'run')
+	shutil.rmtree(workdir, ignore_errors=True)
+	os.makedirs(workdir)
+
+	results = {
+		'meta': {
+			'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'commit': git_commit(),
+			'python': platform.python_version(),
+			'numpy': version('numpy'),
+			'torch': version('torch'),
+			'platform': platform.platform(),
+			'cpus': os.cpu_count(),
+			'chroms': arg.chroms,
+			'length': arg.length,
+			'seed': arg.seed,
+			'sites': arg.sites,
+			'epochs': arg.epochs,
+			'repeat': arg.repeat,
+			'synth_seconds': synth_seconds,
+		},
+		'stages': [],
+	}
+	for name, argv, stdout, inputs in stages(arg, data):
+		if name == 'extract.cold': # drop the genome and GFF indexes
+			for f in (data['genome.fa.gz'][:-3], data['genome.fa.gz'][:-3]
+					+ '.fai', data['anno.gff.gz'] + '.txi'):
+				if os.path.exists(f): os.remove(f)
+		timed = arg.only is None or re.search(arg.only, name)
+		runs = arg.repeat if timed and name != 'extract.cold' else 1
+		times = []
+		rss = []
+		for _ in range(runs):
+			t, m = run_stage(argv, stdout, workdir)
+			times.append(t)
+			rss.append(m)
+		if not timed: continue
+		mb = size(inputs, workdir) / 1e6
+		t = min(times)
+		results['stages'].append({
+			'name': name,
+			'seconds': t,
+			'max_rss_mb': max(rss),
+			'input_mb': mb,
+			'mb_per_s': mb / t if t else None,
+		})
+		print(name, f'{t:.3f}s', f'{max(rss):.1f}MB', sep='\t',
+			file=sys.stderr)
+
+	with open(arg.json, 'w') as fp:
+		json.dump(results, fp, indent=1)
+		fp.write('\n')
+	if arg.baseline:
+		with open(arg.baseline) as fp: baseline = json.load(fp)
+		if compare(results, baseline, arg.tolerance): sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,139 @@
+"""Seeded synthetic genome and annotation for benchmarks
+
+Makes a TAIR-like genome (deflines such as '>1 CHROMOSOME dumped from ADB',
+79 bases per line) with genes laid out between AT-rich intergenic spacers,
+plus an Araport11-style GFF of mRNA and exon lines whose third attribute is
+Parent= and not the last, as transcripts.py expects. Introns start with GT,
+end with AG, and are AT-rich; exons are closer to 50% GC. Genes fall on
+either strand and some have a second isoform that skips an exon. The
+spliced transcripts and their introns are also written as FASTA, like
+cds.fa.gz and introns.fa.gz. Everything depends only on the seed and sizes.
+"""
+
+import argparse
+import gzip
+import os
+
+import numpy as np
+
+NT = np.frombuffer(b'ACGT', dtype=np.uint8)
+COMP = bytes.maketrans(b'ACGT', b'TGCA')
+INTERGENIC = (0.32, 0.18, 0.18, 0.32)
+EXON = (0.28, 0.22, 0.24, 0.26)
+INTRON = (0.30, 0.15, 0.17, 0.38)
+
+def bases(rng, n, p):
+	"""Returns n random bases (bytes) with probabilities p for A, C, G, T"""
+	return NT[rng.choice(4, size=n, p=p)].tobytes()
+
+def anti(seq):
+	return seq.translate(COMP)[::-1]
+
+def gene(rng, max_exons=12):
+	"""Returns (exons, introns) of a gene as lists of bytes, 5' to 3'"""
+	n = min(1 + int(rng.geometric(0.3)), max_exons)
+	exons = []
+	for i in range(n):
+		if i == 0 or i == n - 1: size = int(rng.integers(80, 400))
+		else: size = int(np.clip(rng.lognormal(4.7, 0.6), 30, 1000))
+		exons.append(bases(rng, size, EXON))
+	introns = []
+	for i in range(n - 1):
+		size = int(np.clip(70 + rng.gamma(1.5, 90), 60, 3000))
+		introns.append(b'GT' + bases(rng, size - 4, INTRON) + b'AG')
+	return exons, introns
+
+def chromosome(rng, c, length):
+	"""Returns (sequence, gff lines, cds records, intron records)"""
+	parts = []
+	gff = []
+	cds = []
+	intr = []
+	pos = 0 # 0-based start of the next part
+	n = 0
+	chrom = f'Chr{c}'
+	while True:
+		spacer = int(rng.integers(300, 3000))
+		exons, introns = gene(rng)
+		glen = sum(map(len, exons)) + sum(map(len, introns))
+		if pos + spacer + glen + 1000 > length: break
+		parts.append(bases(rng, spacer, INTERGENIC))
+		pos += spacer
+		n += 1
+		gid = f'AT{c}G{n * 10:05d}'
+		strand = '+' if rng.random() < 0.5 else '-'
+
+		# exon intervals on the gene, 5' to 3'
+		spans = []
+		off = 0
+		for i, exon in enumerate(exons):
+			spans.append((off, off + len(exon)))
+			off += len(exon)
+			if i < len(introns): off += len(introns[i])
+		seq = b''.join(x for pair in zip(exons, introns + [b'']) for x in pair)
+		if strand == '-':
+			seq = anti(seq)
+			spans = [(glen - e, glen - b) for b, e in reversed(spans)]
+		parts.append(seq)
+
+		isoforms = [list(range(len(exons)))]
+		if len(exons) > 2 and rng.random() < 0.3:
+			skip = int(rng.integers(1, len(exons) - 1))
+			isoforms.append([i for i in range(len(exons)) if i != skip])
+		for iso, keep in enumerate(isoforms, 1):
+			tid = f'{gid}.{iso}'
+			gspans = sorted(spans[i] if strand == '+' else
+				spans[len(exons) - 1 - i] for i in keep)
+			beg = pos + gspans[0][0] + 1
+			end = pos + gspans[-1][1]
+			gff.append(f'{chrom}\tAraport11\tmRNA\t{beg}\t{end}\t.\t{strand}'
+				f'\t.\tID={tid};Name={tid};Parent={gid}\n')
+			for j, (b, e) in enumerate(gspans, 1):
+				gff.append(f'{chrom}\tAraport11\texon\t{pos + b + 1}\t{pos + e}'
+					f'\t.\t{strand}\t.\tID={tid}:exon:{j};Name={tid};'
+					f'Parent={tid};Note=exon\n')
+			if iso == 1:
+				cds.append((tid, b''.join(exons)))
+				for j, intron in enumerate(introns, 1):
+					intr.append((f'{tid}-{j}', intron))
+		pos += glen
+	parts.append(bases(rng, length - pos, INTERGENIC))
+	return b''.join(parts), gff, cds, intr
+
+def write_fasta(fp, name, seq, width=79):
+	fp.write(b'>' + name.encode() + b'\n')
+	for i in range(0, len(seq), width):
+		fp.write(seq[i:i+width] + b'\n')
+
+def generate(outdir, chroms=5, length=1000000, seed=1):
+	"""Writes genome.fa.gz, anno.gff.gz, cds.fa.gz, and introns.fa.gz"""
+	os.makedirs(outdir, exist_ok=True)
+	rng = np.random.default_rng(seed)
+	path = {name: os.path.join(outdir, name) for name in
+		('genome.fa.gz', 'anno.gff.gz', 'cds.fa.gz', 'introns.fa.gz')}
+	with gzip.open(path['genome.fa.gz'], 'wb', 6) as gfp, \
+			gzip.open(path['anno.gff.gz'], 'wt', 6) as afp, \
+			gzip.open(path['cds.fa.gz'], 'wb', 6) as cfp, \
+			gzip.open(path['introns.fa.gz'], 'wb', 6) as ifp:
+		afp.write('##gff-version 3\n')
+		for c in range(1, chroms + 1):
+			seq, gff, cds, intr = chromosome(rng, c, length)
+			write_fasta(gfp, f'{c} CHROMOSOME dumped from ADB', seq)
+			afp.writelines(gff)
+			for name, s in cds: write_fasta(cfp, f'{name} | synthetic', s)
+			for name, s in intr: write_fasta(ifp, f'{name} | synthetic', s)
+	return path
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(
+		description='make a synthetic genome, GFF, cds, and introns')
+	parser.add_argument('outdir', help='output directory')
+	parser.add_argument('--chroms', type=int, default=5, metavar='<int>',
+		help='number of chromosomes, at most 5 [%(default)i]')
+	parser.add_argument('--length', type=int, default=1000000, metavar='<int>',
+		help='length of each chromosome [%(default)i]')
+	parser.add_argument('--seed', type=int, default=1, metavar='<int>',
+		help='random seed [%(default)i]')
+	arg = parser.parse_args()
+	if not 1 <= arg.chroms <= 5: parser.error('--chroms must be 1 to 5')
+	generate(arg.outdir, arg.chroms, arg.length, arg.seed)
@@ -3,6 +3,9 @@ import gzip
 import re
 import sys
 import korflab
+from genome import Genome
+import instrument
+from transcripts import TranscriptModel
 
 
 parser = argparse.ArgumentParser()
@@ -16,22 +19,11 @@ parser.add_argument('--min-exon', type=int, default=30,
 	help='minimum exon length [%(default)i]')
 parser.add_argument('--max-exon', type=int, default=1000,
 	help='maximum exon length [%(default)i]')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-genome = {}
-fp = korflab.getfp(arg.gff)
-for line in fp:
-	if line.startswith('#'): continue
-	f = line.split('\t')
-	if f[2] != 'exon': continue
-	chrom = f[0]
-	if chrom not in genome: genome[chrom] = {}
-	tid = f[8].split(';')[2][7:]
-	if tid not in genome[chrom]: genome[chrom][tid] = []
-	genome[chrom][tid].append({
-		'beg': int(f[3]),
-		'end': int(f[4]),
-		'str': f[6]})
+with rec.phase('load'): model = TranscriptModel(arg.gff)
 
 seq2gff = {
 	'1': 'Chr1',
@@ -44,51 +36,52 @@ seq2gff = {
 }
 
 seen = set()
-for defline, seq in korflab.readfasta(arg.fasta):
-	f = defline.split()
-	chrom = seq2gff[f[0]]
-	for tid, exons in genome[chrom].items():
-		gmin = exons[0]['beg']
-		gmax = exons[-1]['end']
+with rec.phase('load'): genome = Genome(arg.fasta)
+with rec.phase('extract'):
+	for name, seq in rec.tally(genome):
+		chrom = seq2gff[name]
+		for tid, begs, ends, strands in model.transcripts(chrom):
+			gmin = begs[0]
+			gmax = ends[-1]
 
-		# skip over genes with non-canonical lengths
-		skip = False
-		for exon in exons:
-			if exon['end'] - exon['beg'] < arg.min_exon:
-				skip = True
-				break
-			if exon['end'] - exon['beg'] > arg.max_exon:
-				skip = True
-				break
-			
-		if skip: continue
-		for i in range(1, len(exons)):
-			ib = exons[i-1]['end'] +1
-			ie = exons[i]['beg'] -1
-			if ie - ib < arg.min_intron:
-				skip = True
-				break
-			if ie - ib > arg.max_intron:
-				skip = True
-				break
-		if skip: continue
-		
-		for exon in exons:
-			eseq = seq[exon['beg']-1:exon['end']]
-			if eseq in seen: continue
-			seen.add(eseq)
-			if exon['str'] == '+': eseq = korflab.anti(eseq)
-			if not re.match('^[ACGT]+$', eseq): continue
-			print('EXON:', eseq)
+			# skip over genes with non-canonical lengths
+			skip = False
+			for beg, end in zip(begs, ends):
+				if end - beg < arg.min_exon:
+					skip = True
+					break
+				if end - beg > arg.max_exon:
+					skip = True
+					break
 				
-		for i in range(1, len(exons)):
-			ib = exons[i-1]['end'] +1
-			ie = exons[i]['beg'] -1
-			iseq = seq[ib-1:ie]
-			if not re.match('^[ACGT]+$', iseq): continue
-			if exons[i]['str'] == '-': iseq = korflab.anti(iseq)
-			if not iseq.startswith('GT'): continue
-			if not iseq.endswith('AG'): continue
-			if iseq in seen: continue
-			seen.add(iseq)
-			print('INTRON:', iseq)
\ No newline at end of file
+			if skip: continue
+			for i in range(1, len(begs)):
+				ib = ends[i-1] +1
+				ie = begs[i] -1
+				if ie - ib < arg.min_intron:
+					skip = True
+					break
+				if ie - ib > arg.max_intron:
+					skip = True
+					break
+			if skip: continue
+			
+			for beg, end, strand in zip(begs, ends, strands):
+				eseq = seq[beg-1:end]
+				if eseq in seen: continue
+				seen.add(eseq)
+				if strand == '+': eseq = korflab.anti(eseq)
+				if not re.match('^[ACGT]+$', eseq): continue
+				print('EXON:', eseq)
+					
+			for i in range(1, len(begs)):
+				ib = ends[i-1] +1
+				ie = begs[i] -1
+				iseq = seq[ib-1:ie]
+				if not re.match('^[ACGT]+$', iseq): continue
+				if strands[i] == '-': iseq = korflab.anti(iseq)
+				if not iseq.startswith('GT'): continue
+				if not iseq.endswith('AG'): continue
+				if iseq in seen: continue
+				seen.add(iseq)
+				print('INTRON:', iseq)
\ No newline at end of file
@@ -1,8 +1,20 @@
 import argparse
 import gzip
 import sys
-import korflab
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from genome import Genome
+import instrument
+from introns import chrom_introns, unique
+from transcripts import TranscriptModel
 
+def write(results, seen, rec):
+	"""Prints introns not seen before as FASTA, 80 bases per line"""
+	for txs in results:
+		for defline, iseq in rec.tally(unique(txs, seen)):
+			print(defline)
+			for i in range(0, len(iseq), 80):
+				print(iseq[i:i+80])
 
 parser = argparse.ArgumentParser()
 parser.add_argument('fasta')
@@ -11,22 +23,13 @@ parser.add_argument('--min-intron', type=int, default=60,
 	help='minimum intron length [%(default)i]')
 parser.add_argument('--max-intron', type=int, default=600,
 	help='maximum intron length [%(default)i]')
+parser.add_argument('--jobs', type=int, default=1,
+	help='number of chromosomes to process in parallel [%(default)i]')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-genome = {}
-fp = korflab.getfp(arg.gff)
-for line in fp:
-	if line.startswith('#'): continue
-	f = line.split('\t')
-	if f[2] != 'exon': continue
-	chrom = f[0]
-	if chrom not in genome: genome[chrom] = {}
-	tid = f[8].split(';')[2][7:]
-	if tid not in genome[chrom]: genome[chrom][tid] = []
-	genome[chrom][tid].append({
-		'beg': int(f[3]),
-		'end': int(f[4]),
-		'str': f[6]})
+with rec.phase('load'): model = TranscriptModel(arg.gff)
 
 seq2gff = {
 	'1': 'Chr1',
@@ -38,40 +41,15 @@ seq2gff = {
 	'chloroplast': 'ChrC'
 }
 
+with rec.phase('load'): genome = Genome(arg.fasta)
+jobs = [(arg.fasta, arg.gff, name, seq2gff[name], arg.min_intron,
+	arg.max_intron) for name in genome.names]
+
 seen = set()
-for defline, seq in korflab.readfasta(arg.fasta):
-	f = defline.split()
-	chrom = seq2gff[f[0]]
-	for tid, exons in genome[chrom].items():
-		gmin = exons[0]['beg']
-		gmax = exons[-1]['end']
-		flip = False
-		introns = []
-		for i in range(1, len(exons)):
-			ib = exons[i-1]['end'] +1
-			ie = exons[i]['beg'] -1
-			ilength = ie - ib + 1
-			if ilength < arg.min_intron: continue
-			if ilength > arg.max_intron: continue
-			iseq = seq[ib-1:ie]
-			if iseq in seen: continue
-			seen.add(iseq)
-			if exons[i]['str'] == '+':
-				rb = ib - gmin + 1
-				re = ie - gmin + 1
-				N = i
-			else:
-				flip = True
-				iseq = korflab.anti(iseq)
-				re = gmax - ib + 1
-				rb = gmax - ie + 1
-				N = len(exons) - i
-			S = 'FORWARD' if exons[i]['str'] == '+' else 'REVERSE'
-			L = ie - ib +1
-			introns.append((f'>{tid}-{N}|{rb}-{re}|{chrom}:{ib}-{ie} {S} LENGTH={L}', iseq))
-		if len(introns) == 0: continue
-		if flip: introns.reverse()
-		for defline, iseq in introns:
-			print(defline)
-			for i in range(0, len(iseq), 80):
-				print(iseq[i:i+80])
+with rec.phase('extract'):
+	if arg.jobs > 1:
+		with ProcessPoolExecutor(arg.jobs, mp_context=get_context('fork')) \
+				as pool:
+			write(pool.map(chrom_introns, *zip(*jobs)), seen, rec)
+	else:
+		write((chrom_introns(*job) for job in jobs), seen, rec)
@@ -1,14 +1,42 @@
 import argparse
-import random
-import korflab
+import sys
+import numpy as np
+import instrument
+import seqio
+from shuffle import kshuffle
 
 parser = argparse.ArgumentParser(
 	description='scramble sequences in a FASTA file')
 parser.add_argument('fasta', help='input fasta file')
+parser.add_argument('--preserve', type=int, default=1, metavar='<int>',
+	help='preserve counts of kmers of this size, 2 for dinucleotides '
+	'[%(default)i]')
+parser.add_argument('--seed', type=int, metavar='<int>',
+	help='set random seed')
+parser.add_argument('--replicates', type=int, default=1, metavar='<int>',
+	help='number of scrambled copies of the file [%(default)i]')
+parser.add_argument('--prefix', metavar='<path>',
+	help='write replicates to <prefix>.<n>.fa instead of stdout')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-for name, seq in korflab.readfasta(arg.fasta):
-	print('>', name, sep='')
-	lseq = list(seq)
-	random.shuffle(lseq)
-	print(''.join(lseq))
+if arg.replicates > 1 and not arg.prefix:
+	parser.error('--replicates needs --prefix')
+
+if arg.prefix:
+	outs = [open(f'{arg.prefix}.{i}.fa', 'wb') for i in range(arg.replicates)]
+else:
+	outs = [sys.stdout.buffer]
+
+rng = np.random.default_rng(arg.seed)
+with rec.phase('shuffle'):
+	for name, seq in rec.tally(seqio.readfasta(arg.fasta)):
+		for out in outs:
+			out.write(b'>' + name.encode() + b'\n')
+			out.write(kshuffle(seq, arg.preserve, rng))
+			out.write(b'\n')
+
+for out in outs: out.flush()
+if arg.prefix:
+	for out in outs: out.close()
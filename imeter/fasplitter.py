@@ -1,15 +1,20 @@
 import argparse
-import random
-import korflab
+import folds
+import instrument
 
 parser = argparse.ArgumentParser(
-	description='randomly split fasta file into 2 parts')
+	description='randomly split fasta file into 2 or more parts')
 parser.add_argument('fasta', help='input fasta file')
-parser.add_argument('out1', help='name of output file 1')
-parser.add_argument('out2', help='name of output file 2')
+parser.add_argument('outputs', nargs='+', metavar='out',
+	help='names of output files')
+parser.add_argument('--mode', choices=folds.MODES, default='random',
+	help='how sequences are assigned to files [%(default)s]')
+parser.add_argument('--seed', type=int, metavar='<int>',
+	help='set random seed, or the hash key with --mode hash')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+if len(arg.outputs) < 2: parser.error('need at least 2 output files')
+rec = instrument.start(arg)
 
-with open(arg.out1, 'w') as fh1, open(arg.out2, 'w') as fh2:
-	for name, seq in korflab.readfasta(arg.fasta):
-		fh = fh1 if random.random() < 0.5 else fh2
-		print(f'>{name}', seq, sep='\n', file=fh)
+with rec.phase('split'):
+	rec.count(sum(folds.split(arg.fasta, arg.outputs, arg.mode, arg.seed)))
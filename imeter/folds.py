@@ -0,0 +1,79 @@
+"""Single-pass splitting of line files and FASTA files into N parts
+
+The input is read once and each record goes to one of N buffered writers.
+A record is a line, or a FASTA entry (written as a defline and a sequence
+line). Assignment is round-robin, seeded random, or by a stable hash of the
+sequence, so identical sequences always land in the same part.
+"""
+
+import hashlib
+import numpy as np
+import seqio
+
+MODES = ('round-robin', 'random', 'hash')
+BLOCK = 1 << 12 # random assignments drawn at a time
+
+def records(fp):
+	"""Yields (record, sequence) as bytes from a line or FASTA file"""
+	first = fp.peek(1)[:1] if hasattr(fp, 'peek') else b''
+	if first != b'>':
+		for line in fp: yield line, line.rstrip()
+		return
+	defline = None
+	seq = []
+	for line in fp:
+		if line.startswith(b'>'):
+			if defline is not None:
+				s = b''.join(seq)
+				yield defline + s + b'\n', s
+			defline = line.rstrip() + b'\n'
+			seq = []
+		else:
+			seq.append(line.strip())
+	if defline is not None:
+		s = b''.join(seq)
+		yield defline + s + b'\n', s
+
+def assigner(mode, n, seed=None):
+	"""Returns a function mapping a sequence (bytes) to a part 0..n-1"""
+	if mode == 'round-robin':
+		state = {'i': -1}
+		def part(seq):
+			state['i'] = (state['i'] + 1) % n
+			return state['i']
+	elif mode == 'random':
+		rng = np.random.default_rng(seed)
+		draws = []
+		def part(seq):
+			if not draws: draws.extend(rng.integers(n, size=BLOCK).tolist()[::-1])
+			return draws.pop()
+	elif mode == 'hash':
+		salt = b'' if seed is None else str(seed).encode()
+		def part(seq):
+			h = hashlib.blake2b(seq, digest_size=8, key=salt).digest()
+			return int.from_bytes(h, 'little') % n
+	else:
+		raise ValueError(f'unknown mode {mode}')
+	return part
+
+def is_fasta(file):
+	"""Returns True if a (possibly gzipped) file starts with '>'"""
+	with _open(file) as fp: return fp.peek(1)[:1] == b'>'
+
+def _open(file):
+	return seqio.open_bytes(file)
+
+def split(file, outputs, mode='round-robin', seed=None, buffering=1 << 20):
+	"""Splits file into the named outputs, returning the records in each"""
+	part = assigner(mode, len(outputs), seed)
+	outs = [open(name, 'wb', buffering=buffering) for name in outputs]
+	counts = [0] * len(outs)
+	try:
+		with _open(file) as fp:
+			for record, seq in records(fp):
+				i = part(seq)
+				outs[i].write(record)
+				counts[i] += 1
+	finally:
+		for out in outs: out.close()
+	return counts
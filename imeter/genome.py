@@ -0,0 +1,183 @@
+"""Random-access, memory-mapped genome sequences (faidx-style)
+
+A gzipped FASTA is decompressed once to a plain FASTA with fixed-width lines
+(TAIR9_chr_all.fas.gz -> TAIR9_chr_all.fas) and indexed with a samtools-style
+.fai file. Later runs memory-map the plain file, so slicing a feature only
+reads the pages that hold it.
+
+Both files are written next to the source if possible. If that directory is
+read-only they go to a cache directory ($XDG_CACHE_HOME or ~/.cache, under
+pypractice/), and if that fails too the genome is decompressed into memory.
+"""
+
+import hashlib
+import io
+import mmap
+import os
+
+import seqio
+
+WIDTH = 80
+
+def _fresh(path, source):
+	return os.path.exists(path) and \
+		os.path.getmtime(path) >= os.path.getmtime(source)
+
+def cache_path(path):
+	"""Returns where a file derived from path goes if its folder is read-only"""
+	root = os.environ.get('XDG_CACHE_HOME') or \
+		os.path.join(os.path.expanduser('~'), '.cache')
+	tag = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+	return os.path.join(root, 'pypractice', f'{tag}-{os.path.basename(path)}')
+
+def _derived(path, source, build):
+	"""Returns path, or its cache path, after build(source, it) if stale
+
+	Returns None if neither location can be written.
+	"""
+	for target in (path, cache_path(path)):
+		if _fresh(target, source): return target
+		try:
+			os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+			build(source, target)
+			return target
+		except OSError:
+			continue
+	return None
+
+def atomic_write(target, write):
+	"""Calls write(fp) on a temporary file, then moves it to target"""
+	tmp = f'{target}.{os.getpid()}.tmp'
+	try:
+		with open(tmp, 'wb') as fp: write(fp)
+		os.replace(tmp, target)
+	except BaseException:
+		if os.path.exists(tmp): os.remove(tmp)
+		raise
+
+def write_plain(source, ofp, width=WIDTH):
+	"""Writes a (gzipped) FASTA to ofp with fixed-width lines"""
+	for name, seq in seqio.readfasta(source):
+		ofp.write(b'>' + name.encode() + b'\n')
+		for i in range(0, len(seq), width):
+			ofp.write(seq[i:i+width] + b'\n')
+
+def decompress(source, target, width=WIDTH):
+	"""Writes a gzipped FASTA out as a plain FASTA with fixed-width lines"""
+	atomic_write(target, lambda fp: write_plain(source, fp, width))
+
+def index_rows(lines, fasta):
+	"""Returns .fai rows [name, length, offset, linebases, linewidth]"""
+	rows = []
+	row = None
+	offset = 0
+	for line in lines:
+		if line.startswith(b'>'):
+			if row is not None: rows.append(row)
+			name = line[1:].split()[0].decode()
+			row = [name, 0, offset + len(line), 0, 0]
+			short = False
+		elif row is None:
+			if line.strip():
+				raise ValueError(f'{fasta}: sequence before first header')
+		else:
+			bases = len(line.rstrip(b'\r\n'))
+			if row[3] == 0:
+				row[3] = bases
+				row[4] = len(line)
+			elif short or bases > row[3]:
+				raise ValueError(f'{fasta}: uneven line lengths in {name}')
+			if bases < row[3]: short = True
+			row[1] += bases
+		offset += len(line)
+	if row is not None: rows.append(row)
+	return rows
+
+def build_index(fasta, fai):
+	"""Writes a samtools-style .fai index for a plain FASTA file"""
+	with open(fasta, 'rb') as fp: rows = index_rows(fp, fasta)
+	text = ''.join('\t'.join(map(str, row)) + '\n' for row in rows)
+	atomic_write(fai, lambda fp: fp.write(text.encode()))
+
+def read_index(fai):
+	"""Reads a .fai file into {name: (length, offset, linebases, linewidth)}"""
+	index = {}
+	with open(fai) as fp:
+		for line in fp:
+			f = line.split('\t')
+			index[f[0]] = tuple(int(x) for x in f[1:5])
+	return index
+
+def _as_index(rows):
+	return {row[0]: tuple(row[1:5]) for row in rows}
+
+class Contig:
+	"""A single sequence in a Genome, sliceable like a str"""
+
+	def __init__(self, genome, name):
+		self.genome = genome
+		self.name = name
+		self.length = genome.index[name][0]
+
+	def __len__(self):
+		return self.length
+
+	def __getitem__(self, key):
+		if isinstance(key, slice):
+			beg, end, step = key.indices(self.length)
+			seq = self.genome.fetch(self.name, beg, end)
+			return seq if step == 1 else seq[::step]
+		if key < 0: key += self.length
+		if not 0 <= key < self.length: raise IndexError('contig index out of range')
+		return self.genome.fetch(self.name, key, key+1)
+
+	def __str__(self):
+		return self.genome.fetch(self.name, 0, self.length)
+
+class Genome:
+	"""Indexed FASTA file, memory-mapped for random access"""
+
+	def __init__(self, fasta):
+		if fasta.endswith('.gz'):
+			plain = _derived(fasta[:-3], fasta, decompress)
+			if plain is None: # nowhere to write, keep it in memory
+				buf = io.BytesIO()
+				write_plain(fasta, buf)
+				self.path = fasta
+				self.mm = buf.getvalue()
+				self.index = _as_index(index_rows(io.BytesIO(self.mm), fasta))
+				self.names = list(self.index)
+				return
+			fasta = plain
+		fai = _derived(f'{fasta}.fai', fasta, build_index)
+		self.path = fasta
+		if fai is not None: self.index = read_index(fai)
+		else:
+			with open(fasta, 'rb') as fp:
+				self.index = _as_index(index_rows(fp, fasta))
+		self.names = list(self.index)
+		with open(fasta, 'rb') as fp:
+			if os.path.getsize(fasta) == 0: self.mm = b''
+			else: self.mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def __contains__(self, name):
+		return name in self.index
+
+	def __getitem__(self, name):
+		return Contig(self, name)
+
+	def __iter__(self):
+		for name in self.names: yield name, self[name]
+
+	def _byte(self, name, pos):
+		length, offset, lb, lw = self.index[name]
+		return offset + (pos // lb) * lw + pos % lb
+
+	def fetch(self, name, beg, end):
+		"""Returns sequence[beg:end] (0-based, half-open) as a str"""
+		length = self.index[name][0]
+		beg = max(0, beg)
+		end = min(end, length)
+		if end <= beg: return ''
+		raw = self.mm[self._byte(name, beg):self._byte(name, end-1) + 1]
+		return raw.translate(None, b'\r\n').decode()
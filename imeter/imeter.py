@@ -0,0 +1,213 @@
+import argparse
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import instrument
+import kmers
+import seqio
+
+MAX_K = 12 # significance counts 2 * 4^k kmers per replicate
+
+def logodds(prox, dist):
+	"""Returns log2(prox/dist) per k-mer, 0 where either is missing or 0"""
+	lod = np.zeros(len(prox))
+	ok = (prox > 0) & (dist > 0)
+	lod[ok] = np.log2(prox[ok] / dist[ok])
+	return lod
+
+def score_batch(seqs, lod, k, donor=5, acceptor=10):
+	"""Returns the IMEter score of each sequence in a list"""
+	lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+	starts = np.zeros(len(seqs), dtype=np.int64)
+	np.cumsum(lengths[:-1], out=starts[1:])
+	codes = kmers.encode(b''.join(seqs))
+	idx, ok = kmers.windows(codes, k)
+	if len(idx) == 0: return np.zeros(len(seqs))
+
+	# window at pos is scored if it lies in seq[donor:len(seq)-acceptor]
+	seg = np.repeat(np.arange(len(seqs)), lengths)[:len(idx)]
+	off = np.arange(len(idx)) - starts[seg]
+	use = ok & (off >= donor) & (off <= lengths[seg] - acceptor - k)
+	return np.bincount(seg[use], weights=lod[idx[use]], minlength=len(seqs))
+
+def score(records, lod, k, donor=5, acceptor=10, batch=kmers.CHUNK):
+	"""Yields (name, score) for each (name, seq) record, e.g. of a FASTA file"""
+	names = []
+	seqs = []
+	size = 0
+	for name, seq in records:
+		names.append(name)
+		seqs.append(seq)
+		size += len(seq)
+		if size >= batch:
+			yield from zip(names, score_batch(seqs, lod, k, donor, acceptor))
+			names = []
+			seqs = []
+			size = 0
+	if seqs: yield from zip(names, score_batch(seqs, lod, k, donor, acceptor))
+
+def cmd_score(arg, rec):
+	try:
+		with rec.phase('load'):
+			k, prox = kmers.load(arg.prox, 'prob')
+			kd, dist = kmers.load(arg.dist, 'prob')
+	except ValueError as e: sys.exit(str(e))
+	if k != kd: sys.exit('proximal and distal tables have different k')
+	lod = logodds(prox, dist)
+	records = rec.tally(seqio.readfasta(arg.fasta))
+	with rec.phase('score'):
+		for name, s in score(records, lod, k, arg.donor, arg.acceptor):
+			print(name, s.item(), sep='\t')
+
+class IntronSets:
+	"""Two intron sets encoded once into one buffer of 2-bit codes"""
+
+	def __init__(self, fasta1, fasta2, k):
+		seqs = []
+		labels = []
+		for label, fasta in enumerate((fasta1, fasta2)):
+			for name, seq in seqio.readfasta(fasta):
+				seqs.append(seq)
+				labels.append(label)
+		self.k = k
+		self.labels = np.array(labels, dtype=np.int64)
+		lengths = np.array([len(seq) + 1 for seq in seqs], dtype=np.int64)
+
+		# sequences are separated by an N, which gets its own segment so
+		# that scrambling leaves it in place
+		self.codes = kmers.encode(b'N'.join(seqs) + b'N')
+		self.segment = np.repeat(np.arange(len(seqs)) * 2, lengths)
+		ends = np.cumsum(lengths) - 1
+		self.segment[ends] += 1
+		idx, ok = kmers.windows(self.codes, k)
+		self.seqid = self.segment[:len(idx)] // 2
+		self.idx = idx[ok]
+		self.ok = ok
+		self.wseq = self.seqid[ok]
+
+	def stats(self, labels, idx=None, wseq=None):
+		"""Returns KL(set1||set2) and summed absolute difference"""
+		if idx is None: idx, wseq = self.idx, self.wseq
+		size = 4 ** self.k
+		counts = np.bincount(idx + labels[wseq] * size, minlength=2 * size)
+		counts = counts.reshape(2, size) + 1 # pseudo-count, like kmercount.py
+		P = counts / counts.sum(axis=1, keepdims=True)
+		dkl, dtc = kmers.compare(P)
+		return dkl[0, 1], dtc[0, 1]
+
+	def scramble(self, rng):
+		"""Returns window indices and sequence ids after shuffling each sequence"""
+		order = np.argsort(self.segment + rng.random(len(self.codes)))
+		idx, ok = kmers.windows(self.codes[order], self.k)
+		return idx[ok], self.seqid[ok]
+
+_sets = None
+
+def _init_worker(sets):
+	global _sets
+	_sets = sets
+
+def _replicates(n, seed, split, scramble):
+	"""Returns statistics for n null replicates"""
+	rng = np.random.default_rng(seed)
+	out = np.zeros((n, 2))
+	for r in range(n):
+		labels = rng.permutation(_sets.labels) if split else _sets.labels
+		if scramble: idx, wseq = _sets.scramble(rng)
+		else:        idx, wseq = _sets.idx, _sets.wseq
+		out[r] = _sets.stats(labels, idx, wseq)
+	return out
+
+def null_distribution(sets, replicates, seed=None, split=True, scramble=False,
+		jobs=1, chunk=50):
+	"""Returns an array of (KL, abs diff) for each null replicate
+
+	Replicates are run in chunks, each with its own child seed, so results
+	only depend on the seed and not on the number of jobs.
+	"""
+	sizes = [min(chunk, replicates - i) for i in range(0, replicates, chunk)]
+	seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+	args = [(n, s, split, scramble) for n, s in zip(sizes, seeds)]
+	if jobs > 1:
+		with ProcessPoolExecutor(jobs, mp_context=get_context('fork'),
+				initializer=_init_worker, initargs=(sets,)) as pool:
+			results = list(pool.map(_replicates, *zip(*args)))
+	else:
+		_init_worker(sets)
+		results = [_replicates(*a) for a in args]
+	return np.concatenate(results) if results else np.zeros((0, 2))
+
+def cmd_significance(arg, rec):
+	if not (arg.split or arg.scramble): arg.split = True
+	with rec.phase('load'): sets = IntronSets(arg.fasta1, arg.fasta2, arg.k)
+	rec.count(len(sets.labels), len(sets.codes) - len(sets.labels))
+	with rec.phase('compare'): observed = sets.stats(sets.labels)
+	with rec.phase('null'):
+		null = null_distribution(sets, arg.replicates, arg.seed, arg.split,
+			arg.scramble, arg.jobs)
+	if arg.null:
+		with rec.phase('write'):
+			np.savetxt(arg.null, null, delimiter='\t', header='dkl\tdtc')
+
+	n = len(null)
+	print('stat', 'observed', 'null_mean', 'null_sd', 'null_q95', 'p', sep='\t')
+	for i, name in enumerate(('dkl', 'dtc')):
+		ge = int((null[:, i] >= observed[i]).sum())
+		p = (ge + 1) / (n + 1)
+		mean = null[:, i].mean() if n else math.nan
+		sd = null[:, i].std(ddof=1) if n > 1 else math.nan
+		q95 = np.quantile(null[:, i], 0.95) if n else math.nan
+		print(name, observed[i], mean, sd, q95, p, sep='\t')
+
+
+#########
+## CLI ##
+#########
+
+parser = argparse.ArgumentParser(description='IMEter tools')
+sub = parser.add_subparsers(dest='command', required=True)
+
+p = sub.add_parser('score', help='score introns with kmer log-odds',
+	description='score every sequence in a FASTA file by summing '
+	'log2(prox/dist) over its kmers')
+p.add_argument('fasta', help='input fasta file')
+p.add_argument('prox',
+	help='proximal kmer table or profile from kmercount.py --prob')
+p.add_argument('dist',
+	help='distal kmer table or profile from kmercount.py --prob')
+p.add_argument('--donor', type=int, default=5, metavar='<int>',
+	help='bases skipped at the donor end [%(default)i]')
+p.add_argument('--acceptor', type=int, default=10, metavar='<int>',
+	help='bases skipped at the acceptor end [%(default)i]')
+instrument.add_arguments(p)
+p.set_defaults(func=cmd_score)
+
+p = sub.add_parser('significance',
+	help='permutation test of kmer differences between 2 intron sets',
+	description='compare the kmer composition of 2 intron sets against a '
+	'null distribution from random splits and/or scrambles, all in memory')
+p.add_argument('fasta1', help='first fasta file, e.g. proximal introns')
+p.add_argument('fasta2', help='second fasta file, e.g. distal introns')
+p.add_argument('k', type=int, help=f'size of k, at most {MAX_K}')
+p.add_argument('--replicates', type=int, default=1000, metavar='<int>',
+	help='number of null replicates [%(default)i]')
+p.add_argument('--split', action='store_true',
+	help='null replicates randomly re-split the pooled sequences (default)')
+p.add_argument('--scramble', action='store_true',
+	help='null replicates shuffle nucleotides within each sequence')
+p.add_argument('--jobs', type=int, default=1, metavar='<int>',
+	help='number of worker processes [%(default)i]')
+p.add_argument('--seed', type=int, metavar='<int>',
+	help='set random seed')
+p.add_argument('--null', metavar='<path>',
+	help='write the null distribution to this file')
+instrument.add_arguments(p)
+p.set_defaults(func=cmd_significance)
+
+arg = parser.parse_args()
+if arg.command == 'significance' and not 1 <= arg.k <= MAX_K:
+	p.error(f'k must be from 1 to {MAX_K}')
+arg.func(arg, instrument.start(arg, f'imeter.py {arg.command}'))
@@ -0,0 +1,151 @@
+"""Optional timing, throughput, and memory reports for the scripts
+
+add_arguments() gives a script --stats and --profile <phase>. start() then
+returns a Recorder if either was used and OFF if not. OFF does nothing: its
+phase() is a shared null context, tally() hands back its argument, and
+count() returns at once. cProfile, json, and resource are only imported by
+a Recorder, so with the flags off a script pays for no more than a few
+empty calls.
+
+A Recorder times named phases (load, parse, count, score, write, ...);
+repeated phases add up. It counts records and bases, and at exit it writes
+one JSON line to stderr with the wall time, the phases, the records and
+bases per second, and the peak RSS of the process and of its largest child.
+With --profile, that phase runs under cProfile and its most expensive
+functions go into the same line.
+"""
+
+import atexit
+import contextlib
+import os
+import sys
+import time
+
+TOP = 20 # functions reported from a profile
+
+def add_arguments(parser):
+	"""Adds --stats and --profile to an argparse parser"""
+	parser.add_argument('--stats', action='store_true',
+		help='write phase times, throughput, and peak memory to stderr as '
+		'JSON')
+	parser.add_argument('--profile', metavar='<phase>',
+		help='also run this phase (e.g. load, parse, count, score, write) '
+		'under cProfile, implies --stats')
+
+class _Off:
+	"""Stands in for a Recorder when --stats is off"""
+
+	_null = contextlib.nullcontext()
+
+	def __bool__(self):
+		return False
+
+	def phase(self, name):
+		return self._null
+
+	def count(self, records=0, bases=0):
+		pass
+
+	def tally(self, records):
+		return records
+
+OFF = _Off()
+
+def start(arg, tool=None):
+	"""Returns a Recorder if arg asks for --stats or --profile, else OFF"""
+	profile = getattr(arg, 'profile', None)
+	if not (getattr(arg, 'stats', False) or profile): return OFF
+	rec = Recorder(tool or os.path.basename(sys.argv[0]), profile)
+	atexit.register(rec.emit)
+	return rec
+
+def _peak_mb(children=False):
+	try: import resource
+	except ImportError: return None # not on Windows
+	who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+	peak = resource.getrusage(who).ru_maxrss
+	return peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+class Recorder:
+	"""Collects phase times and record counts for one run of a tool"""
+
+	def __init__(self, tool, profile=None):
+		self.tool = tool
+		self.start = time.perf_counter()
+		self.phases = {}
+		self.records = 0
+		self.bases = 0
+		self.profile = profile
+		self.profiler = None
+
+	def __bool__(self):
+		return True
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		"""Times the enclosed block as phase name"""
+		prof = None
+		if name == self.profile:
+			import cProfile
+			if self.profiler is None: self.profiler = cProfile.Profile()
+			prof = self.profiler
+			prof.enable()
+		t0 = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.phases[name] = self.phases.get(name, 0) + \
+				time.perf_counter() - t0
+			if prof: prof.disable()
+
+	def count(self, records=0, bases=0):
+		self.records += records
+		self.bases += bases
+
+	def tally(self, records):
+		"""Yields records, counting them and their bases as they go by
+
+		A record is a sequence or a tuple ending in one, like (name, seq).
+		"""
+		for rec in records:
+			seq = rec[-1] if isinstance(rec, tuple) else rec
+			self.records += 1
+			self.bases += len(seq)
+			yield rec
+
+	def _functions(self):
+		import pstats
+		st = pstats.Stats(self.profiler)
+		rows = sorted(st.stats.items(), key=lambda item: -item[1][3])
+		out = []
+		for (file, line, func), (cc, nc, tt, ct, _) in rows[:TOP]:
+			out.append({'function': f'{os.path.basename(file)}:{line}({func})',
+				'calls': nc, 'tottime': round(tt, 6), 'cumtime': round(ct, 6)})
+		return out
+
+	def report(self):
+		"""Returns the statistics so far as a dict"""
+		wall = time.perf_counter() - self.start
+		out = {
+			'tool': self.tool,
+			'argv': sys.argv[1:],
+			'wall': round(wall, 6),
+			'phases': {k: round(v, 6) for k, v in self.phases.items()},
+			'records': self.records,
+			'bases': self.bases,
+			'records_per_s': round(self.records / wall, 1) if wall else None,
+			'bases_per_s': round(self.bases / wall, 1) if wall else None,
+			'max_rss_mb': _peak_mb(),
+			'children_max_rss_mb': _peak_mb(children=True),
+		}
+		if self.profile:
+			out['profile'] = {'phase': self.profile,
+				'functions': self._functions() if self.profiler else []}
+		return out
+
+	def emit(self, fp=None):
+		"""Writes report() to stderr as one line of JSON"""
+		import json
+		fp = fp or sys.stderr
+		fp.write(json.dumps(self.report()) + '\n')
+		fp.flush()
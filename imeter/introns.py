@@ -0,0 +1,64 @@
+"""Intron extraction from an indexed genome and transcript model
+
+Work is split by chromosome so it can run in a process pool. Each worker
+removes duplicates within its chromosome; unique() then removes duplicates
+across chromosomes in the serial order, so the output does not depend on how
+many workers were used.
+"""
+
+import korflab
+from genome import Genome
+from transcripts import TranscriptModel
+
+def chrom_introns(fasta, gff, name, chrom, min_intron, max_intron):
+	"""Returns candidate introns of each transcript on one chromosome
+
+	Each transcript is a list of (genomic seq, defline, seq, minus) tuples in
+	genomic order, where seq is reverse-complemented for minus-strand introns.
+	"""
+	seq = Genome(fasta)[name]
+	model = TranscriptModel(gff)
+	seen = set()
+	txs = []
+	for tid, begs, ends, strands in model.transcripts(chrom):
+		gmin = begs[0]
+		gmax = ends[-1]
+		introns = []
+		for i in range(1, len(begs)):
+			ib = ends[i-1] +1
+			ie = begs[i] -1
+			ilength = ie - ib + 1
+			if ilength < min_intron: continue
+			if ilength > max_intron: continue
+			gseq = seq[ib-1:ie]
+			if gseq in seen: continue
+			seen.add(gseq)
+			if strands[i] == '+':
+				iseq = gseq
+				rb = ib - gmin + 1
+				re = ie - gmin + 1
+				N = i
+			else:
+				iseq = korflab.anti(gseq)
+				re = gmax - ib + 1
+				rb = gmax - ie + 1
+				N = len(begs) - i
+			S = 'FORWARD' if strands[i] == '+' else 'REVERSE'
+			L = ie - ib +1
+			defline = f'>{tid}-{N}|{rb}-{re}|{chrom}:{ib}-{ie} {S} LENGTH={L}'
+			introns.append((gseq, defline, iseq, strands[i] == '-'))
+		if introns: txs.append(introns)
+	return txs
+
+def unique(txs, seen):
+	"""Yields (defline, seq) of introns not in seen, in transcript order"""
+	for introns in txs:
+		keep = []
+		flip = False
+		for gseq, defline, iseq, minus in introns:
+			if gseq in seen: continue
+			seen.add(gseq)
+			if minus: flip = True
+			keep.append((defline, iseq))
+		if flip: keep.reverse()
+		yield from keep
@@ -1,22 +1,26 @@
 import argparse
-import korflab
+import instrument
+import seqio
 
 parser = argparse.ArgumentParser(description='split introns based on position')
 parser.add_argument('fasta', help='input fasta file')
 parser.add_argument('split', type=int)
 parser.add_argument('--high', action='store_true', help='keep high, not low')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-for name, seq in korflab.readfasta(arg.fasta):
-	f = name.split('|')
-	beg, end = f[1].split('-')
-	beg = int(beg)
-	if arg.high:
-		if beg > arg.split:
-			print('>', name, sep='')
-			print(seq)
-	else:
-		if beg <= arg.split:
-			print('>', name, sep='')
-			print(seq)
+with rec.phase('split'):
+	for name, seq in rec.tally(seqio.readfasta(arg.fasta, text=True)):
+		f = name.split('|')
+		beg, end = f[1].split('-')
+		beg = int(beg)
+		if arg.high:
+			if beg > arg.split:
+				print('>', name, sep='')
+				print(seq)
+		else:
+			if beg <= arg.split:
+				print('>', name, sep='')
+				print(seq)
 		
\ No newline at end of file
@@ -1,27 +1,53 @@
 import argparse
-import math
+import sys
+
+import numpy as np
 import korflab
+import instrument
+import kmers
 
-def readkmers(filename):
-	kdict = {}
-	with open(filename) as fp:
-		for line in fp:
-			kmer, prob = line.split()
-			kdict[kmer] = float(prob)
-	return kdict
+def print_matrix(title, names, M):
+	print(f'# {title}')
+	print('', *names, sep='\t')
+	for name, row in zip(names, M.tolist()):
+		print(name, *row, sep='\t')
 
 parser = argparse.ArgumentParser(description='compare kmer probabilities')
-parser.add_argument('file1', help='input kmer file 1')
-parser.add_argument('file2', help='input kmer file 2')
+parser.add_argument('files', nargs='+', metavar='file',
+	help='input kmer tables or profiles (probabilities)')
+parser.add_argument('--matrix', action='store_true',
+	help='report matrices even when comparing 2 files')
+parser.add_argument('--pseudo', type=float, default=1, metavar='<float>',
+	help='pseudo-count added to every kmer of sparse tables [%(default)g]')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+if len(arg.files) < 2: parser.error('need at least 2 files to compare')
+if arg.pseudo <= 0: parser.error('--pseudo must be positive')
+rec = instrument.start(arg)
 
-k1 = readkmers(arg.file1)
-k2 = readkmers(arg.file2)
+k = None
+tables = []
+for filename in arg.files:
+	try:
+		with rec.phase('load'):
+			kf, keys, probs, unseen = kmers.load_sparse(filename, arg.pseudo)
+	except ValueError as e: sys.exit(str(e))
+	if k is None: k = kf
+	elif kf != k: sys.exit(f'{filename}: k={kf}, expected {k}')
+	tables.append((keys, probs, unseen))
+rec.count(len(arg.files))
 
-dkl = 0
-dtc = 0
-for kmer in k1:
-	dkl += k1[kmer] * math.log2(k1[kmer] / k2[kmer])
-	dtc += abs(k1[kmer] - k2[kmer])
+with rec.phase('compare'):
+	if all(keys is None for keys, _, _ in tables):
+		dkl, dtc = kmers.compare(np.array([probs for _, probs, _ in tables]))
+	else:
+		dkl, dtc = kmers.compare_sparse(tables, k)
 
-print(dkl, dtc)
\ No newline at end of file
+with rec.phase('write'):
+	if len(arg.files) == 2 and not arg.matrix:
+		print(dkl[0, 1].item(), dtc[0, 1].item())
+	else:
+		print_matrix('KL divergence in bits, D(row||column)', arg.files, dkl)
+		print()
+		print_matrix('total variation distance, half the sum of absolute '
+			'differences', arg.files, 0.5 * dtc)
@@ -1,25 +1,48 @@
 import argparse
 import sys
-import korflab
+import instrument
+import kmers
+import seqio
 
 parser = argparse.ArgumentParser(description='count kmers')
 parser.add_argument('fasta', help='input fasta file')
 parser.add_argument('k', type=int, help='size of k')
 parser.add_argument('--prob', action='store_true',
 	help='report probabilities instead of counts')
+parser.add_argument('--binary', action='store_true',
+	help='write a binary profile instead of a text table')
+parser.add_argument('--sparse', action='store_true',
+	help='report observed kmers only, without pseudo-counts (implied for '
+	f'k > {kmers.MAX_DENSE_K})')
+parser.add_argument('--max-memory', type=int, default=1024, metavar='<int>',
+	help='memory budget in MB for sparse counting [%(default)i]')
+parser.add_argument('--tmpdir', metavar='<path>',
+	help='where sparse counting spills sorted runs [system default]')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-if arg.k > 10: sys.exit(f'{sys.argv[0]} not designed for large values of k')
-kdict = korflab.kmers(arg.k, init=1)
+if arg.k > kmers.MAX_SPARSE_K:
+	sys.exit(f'{sys.argv[0]} not designed for large values of k')
+seqs = rec.tally(seq for name, seq in seqio.readfasta(arg.fasta))
 
-for name, seq in korflab.readfasta(arg.fasta):
-	for i in range(len(seq) - arg.k + 1):
-		kmer = seq[i:i+arg.k]
-		if kmer in kdict: kdict[kmer] += 1
+if arg.binary and (arg.sparse or arg.k > kmers.MAX_DENSE_K):
+	sys.exit(f'binary profiles are limited to k <= {kmers.MAX_DENSE_K}')
 
-if arg.prob:
-	total = sum(kdict.values())
-	for k, v in kdict.items(): kdict[k] = v / total
-
-for kmer, value in kdict.items():
-	print(kmer, value, sep='\t')
+if arg.sparse or arg.k > kmers.MAX_DENSE_K:
+	with rec.phase('count'):
+		total, blocks = kmers.count_sparse(seqs, arg.k,
+			max_memory=arg.max_memory << 20, tmpdir=arg.tmpdir)
+	with rec.phase('write'):
+		kmers.write_sparse(sys.stdout, total, blocks, arg.k, prob=arg.prob)
+else:
+	with rec.phase('count'): counts = kmers.count(seqs, arg.k, init=1)
+	with rec.phase('write'):
+		if arg.binary and arg.prob:
+			kmers.write_profile(sys.stdout.buffer, counts / counts.sum(), arg.k,
+				'prob', pseudo=1)
+		elif arg.binary:
+			kmers.write_profile(sys.stdout.buffer, counts, arg.k, 'counts',
+				pseudo=1)
+		else:
+			kmers.write_table(sys.stdout, counts, arg.k, prob=arg.prob)
@@ -0,0 +1,31 @@
+import argparse
+import sys
+import instrument
+import kmers
+
+parser = argparse.ArgumentParser(
+	description='merge binary kmer count profiles, e.g. from sharded runs')
+parser.add_argument('profiles', nargs='+',
+	help='count profiles from kmercount.py --binary')
+parser.add_argument('--prob', action='store_true',
+	help='report probabilities instead of counts')
+parser.add_argument('--text', action='store_true',
+	help='write a text table instead of a binary profile')
+instrument.add_arguments(parser)
+arg = parser.parse_args()
+rec = instrument.start(arg)
+
+with rec.phase('merge'):
+	try: k, counts, pseudo = kmers.merge_profiles(arg.profiles)
+	except ValueError as e: sys.exit(str(e))
+rec.count(len(arg.profiles))
+
+with rec.phase('write'):
+	if arg.text:
+		kmers.write_table(sys.stdout, counts, k, prob=arg.prob)
+	elif arg.prob:
+		kmers.write_profile(sys.stdout.buffer, counts / counts.sum(), k, 'prob',
+			pseudo=pseudo)
+	else:
+		kmers.write_profile(sys.stdout.buffer, counts, k, 'counts',
+			pseudo=pseudo)
@@ -0,0 +1,387 @@
+"""Vectorized k-mer counting with 2-bit nucleotide codes
+
+Sequences are encoded to codes A=0, C=1, G=2, T=3 (anything else is 4). The
+index of a k-mer is its codes read as a base-4 number, which puts k-mers in
+the same order as korflab.kmers(): AAA..A, AAA..C, ... TTT..T. Windows that
+contain a code of 4 are skipped.
+
+Up to k=13 counts are kept in a dense 4^k table. Beyond that, count_sparse()
+packs k-mers into uint64 keys and counts them by sorting, spilling sorted runs
+to disk when a memory budget is exceeded.
+
+Dense tables can be saved as binary profiles: a 32-byte header (magic, k,
+kind, dtype, alphabet, pseudo-count) followed by the 4^k values as
+little-endian uint64 (counts) or float64 (probabilities, log-odds). Profiles
+are memory-mapped on load, and count profiles merge by summing arrays.
+"""
+
+import itertools
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+ALPHABET = 'ACGT'
+MAX_DENSE_K = 13
+MAX_SPARSE_K = 31
+CHUNK = 1 << 22 # bytes of sequence encoded per batch
+
+PROFILE_MAGIC = b'KMERPRF1'
+PROFILE_HEADER = struct.Struct('<8sBBcx4sd8x')
+PROFILE_KINDS = ('counts', 'prob', 'logodds')
+
+LOOKUP = np.full(256, 4, dtype=np.uint8)
+for code, nt in enumerate(ALPHABET): LOOKUP[ord(nt)] = code
+
+def encode(seq):
+	"""Returns the 2-bit codes of a sequence (str or bytes) as a uint8 array"""
+	if isinstance(seq, str): seq = seq.encode()
+	return LOOKUP[np.frombuffer(seq, dtype=np.uint8)]
+
+def windows(codes, k, dtype=np.int64):
+	"""Returns the k-mer index of every window and a mask of valid windows"""
+	n = max(len(codes) - k + 1, 0)
+	bad = np.zeros(len(codes) + 1, dtype=np.int32)
+	np.cumsum(codes > 3, out=bad[1:])
+	ok = bad[k:k+n] == bad[:n]
+	idx = np.zeros(n, dtype=dtype)
+	for j in range(k):
+		idx <<= 2
+		idx |= codes[j:j+n] & 3
+	return idx, ok
+
+def kmer_index(codes, k, dtype=np.int64):
+	"""Returns the k-mer index of every window free of non-ACGT codes"""
+	idx, ok = windows(codes, k, dtype)
+	return idx[ok]
+
+def batches(seqs, size=CHUNK):
+	"""Joins sequences with N separators into batches of at least size bytes"""
+	batch = []
+	total = 0
+	for seq in seqs:
+		if isinstance(seq, str): seq = seq.encode()
+		batch.append(seq)
+		total += len(seq) + 1
+		if total >= size:
+			yield b'N'.join(batch)
+			batch = []
+			total = 0
+	if batch: yield b'N'.join(batch)
+
+def count(seqs, k, init=0):
+	"""Returns a dense array of k-mer counts over an iterable of sequences"""
+	if k > MAX_DENSE_K: raise ValueError(f'k={k} too large for a dense table')
+	size = 4 ** k
+	dtype = np.int64 if size <= 1 << 24 else np.uint32
+	counts = np.full(size, init, dtype=dtype)
+	for batch in batches(seqs):
+		idx = kmer_index(encode(batch), k)
+		if dtype is np.int64:
+			counts += np.bincount(idx, minlength=size)
+		else:
+			uniq, n = np.unique(idx, return_counts=True)
+			counts[uniq] += n.astype(dtype)
+	return counts
+
+def _reduce(keys, counts):
+	"""Sums counts of identical keys, returns sorted unique keys and sums"""
+	order = np.argsort(keys, kind='stable')
+	keys = keys[order]
+	counts = counts[order]
+	if len(keys) == 0: return keys, counts
+	starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+	return keys[starts], np.add.reduceat(counts, starts)
+
+def _merge_runs(paths, block):
+	"""Yields (keys, counts) blocks from a k-way merge of sorted runs"""
+	runs = []
+	for path in paths:
+		keys = np.load(f'{path}.keys.npy', mmap_mode='r')
+		counts = np.load(f'{path}.counts.npy', mmap_mode='r')
+		if len(keys): runs.append([keys, counts, 0])
+	while runs:
+		# every key <= bound is in the current block of every run
+		bound = min(r[0][min(r[2] + block, len(r[0])) - 1] for r in runs)
+		ks = []
+		cs = []
+		for r in runs:
+			keys, counts, pos = r
+			end = pos + np.searchsorted(keys[pos:pos+block], bound, 'right')
+			ks.append(keys[pos:end])
+			cs.append(counts[pos:end])
+			r[2] = end
+		runs = [r for r in runs if r[2] < len(r[0])]
+		yield _reduce(np.concatenate(ks), np.concatenate(cs))
+
+def count_sparse(seqs, k, max_memory=1 << 30, tmpdir=None):
+	"""Counts k-mers with bounded memory
+
+	Returns (total, blocks) where blocks yields (keys, counts) arrays in
+	ascending key order. Only k-mers that were observed are reported.
+	"""
+	if k > MAX_SPARSE_K: raise ValueError(f'k={k} too large for uint64 keys')
+	budget = max(max_memory // 32, 1 << 16) # keys per buffer or run
+	buffered = []
+	nbuf = 0
+	runs = []
+	nrun = 0
+	spills = []
+	total = 0
+	tmp = None
+
+	def flush():
+		nonlocal buffered, nbuf, nrun
+		if nbuf == 0: return
+		keys, counts = np.unique(np.concatenate(buffered), return_counts=True)
+		runs.append((keys, counts.astype(np.uint64)))
+		nrun += len(keys)
+		buffered = []
+		nbuf = 0
+
+	def spill():
+		nonlocal runs, nrun, tmp
+		if nrun == 0: return
+		keys, counts = _reduce(np.concatenate([r[0] for r in runs]),
+			np.concatenate([r[1] for r in runs]))
+		if tmp is None: tmp = tempfile.TemporaryDirectory(dir=tmpdir)
+		path = os.path.join(tmp.name, f'run{len(spills)}')
+		np.save(f'{path}.keys.npy', keys)
+		np.save(f'{path}.counts.npy', counts)
+		spills.append(path)
+		runs = []
+		nrun = 0
+
+	for batch in batches(seqs):
+		idx = kmer_index(encode(batch), k, dtype=np.uint64)
+		total += len(idx)
+		buffered.append(idx)
+		nbuf += len(idx)
+		if nbuf >= budget: flush()
+		if nrun >= budget: spill()
+	flush()
+
+	def blocks():
+		if spills:
+			spill()
+			yield from _merge_runs(spills, budget // max(len(spills), 1))
+			tmp.cleanup()
+		elif runs:
+			keys, counts = _reduce(np.concatenate([r[0] for r in runs]),
+				np.concatenate([r[1] for r in runs]))
+			for i in range(0, len(keys), budget):
+				yield keys[i:i+budget], counts[i:i+budget]
+
+	return total, blocks()
+
+def read_sparse(filename):
+	"""Reads a kmer<tab>value table into (k, sorted keys, values)"""
+	kmers = []
+	vals = []
+	with open(filename) as fp:
+		for line in fp:
+			kmer, val = line.split()
+			kmers.append(kmer)
+			vals.append(float(val))
+	if not kmers: raise ValueError(f'{filename}: empty table')
+	k = len(kmers[0])
+	if k > MAX_SPARSE_K: raise ValueError(f'{filename}: k={k} too large')
+	idx, ok = windows(encode(''.join(kmers)), k, dtype=np.uint64)
+	idx = idx[::k]
+	if not ok[::k].all() or any(len(kmer) != k for kmer in kmers):
+		raise ValueError(f'{filename}: invalid kmers')
+	order = np.argsort(idx, kind='stable')
+	return k, idx[order], np.array(vals)[order]
+
+def read_table(filename):
+	"""Reads a kmer<tab>value table into (k, dense array of values)
+
+	K-mers missing from the table (e.g. sparse tables) are 0.
+	"""
+	k, keys, vals = read_sparse(filename)
+	if k > MAX_DENSE_K: raise ValueError(f'{filename}: k={k} too large')
+	table = np.zeros(4 ** k)
+	table[keys] = vals
+	return k, table
+
+def write_profile(fp, values, k, kind, pseudo=0):
+	"""Writes a dense table to a binary file object as a profile"""
+	if kind == 'counts': values = np.asarray(values, dtype='<u8')
+	else:                values = np.asarray(values, dtype='<f8')
+	if len(values) != 4 ** k: raise ValueError('profile must have 4^k values')
+	fp.write(PROFILE_HEADER.pack(PROFILE_MAGIC, k, PROFILE_KINDS.index(kind),
+		values.dtype.char.encode(), ALPHABET.encode(), pseudo))
+	fp.write(values.tobytes())
+
+def read_profile(filename):
+	"""Memory-maps a binary profile, returns (header dict, values)"""
+	with open(filename, 'rb') as fp:
+		head = fp.read(PROFILE_HEADER.size)
+	magic, k, kind, char, alph, pseudo = PROFILE_HEADER.unpack(head)
+	if magic != PROFILE_MAGIC: raise ValueError(f'{filename}: not a profile')
+	if alph.decode() != ALPHABET: raise ValueError(f'{filename}: bad alphabet')
+	info = {'k': k, 'kind': PROFILE_KINDS[kind], 'pseudo': pseudo,
+		'alphabet': alph.decode()}
+	values = np.memmap(filename, dtype=np.dtype(char.decode()).newbyteorder('<'),
+		mode='r', offset=PROFILE_HEADER.size, shape=(4 ** k,))
+	return info, values
+
+def is_profile(filename):
+	"""Returns True if the file starts with the binary profile magic"""
+	with open(filename, 'rb') as fp: return fp.read(8) == PROFILE_MAGIC
+
+def as_prob(values, filename):
+	"""Returns a table of counts or probabilities as probabilities"""
+	if (values < 0).any():
+		raise ValueError(f'{filename}: negative values, not probabilities')
+	total = values.sum()
+	if total == 0: raise ValueError(f'{filename}: all values are 0')
+	if abs(total - 1) > 1e-6: values = values / total # counts
+	return values
+
+def load(filename, kind=None):
+	"""Reads a binary profile or a kmer<tab>value table as (k, values)
+
+	With kind, a profile of another kind raises ValueError, except that
+	counts are turned into probabilities when kind is 'prob'. Tables do not
+	record their kind, so only 'prob' is checked for them.
+	"""
+	if is_profile(filename):
+		info, values = read_profile(filename)
+		if kind == 'prob' and info['kind'] == 'counts':
+			values = values / values.sum()
+		elif kind and info['kind'] != kind:
+			raise ValueError(f'{filename}: {info["kind"]} profile, '
+				f'expected {kind}')
+		return info['k'], values
+	k, values = read_table(filename)
+	if kind == 'prob': values = as_prob(values, filename)
+	return k, values
+
+def load_sparse(filename, pseudo=1):
+	"""Reads a profile or table as probabilities, (k, keys, probs, unseen)
+
+	unseen is the probability of every k-mer not in keys. Profiles and
+	complete tables have every k-mer in order, so keys is None and unseen
+	is 0. Sparse tables get pseudo added to the count of every k-mer, as
+	kmercount.py adds 1 for dense ones. The counts behind a table of
+	probabilities are unknown, so its rarest k-mer is taken to have been
+	seen once.
+	"""
+	if is_profile(filename):
+		k, values = load(filename, 'prob')
+		return k, None, values, 0.0
+	k, keys, values = read_sparse(filename)
+	probs = as_prob(values, filename)
+	if len(keys) == 4 ** k and (values > 0).all(): return k, None, probs, 0.0
+	counts = values
+	if probs is values: # already probabilities
+		counts = values / values[values > 0].min()
+	total = counts.sum() + pseudo * 4 ** k
+	return k, keys, (counts + pseudo) / total, pseudo / total
+
+def merge_profiles(filenames):
+	"""Sums count profiles, returns (k, counts, pseudo)
+
+	Each input carries its own pseudo-counts, so all but one copy of them
+	is removed from the sum.
+	"""
+	total = None
+	for filename in filenames:
+		info, values = read_profile(filename)
+		if info['kind'] != 'counts':
+			raise ValueError(f'{filename}: only count profiles can be merged')
+		if total is None:
+			k = info['k']
+			pseudo = info['pseudo']
+			total = np.array(values, dtype=np.uint64)
+			continue
+		if info['k'] != k: raise ValueError(f'{filename}: k != {k}')
+		if info['pseudo'] != pseudo:
+			raise ValueError(f'{filename}: pseudo-count != {pseudo}')
+		total += values
+		total -= np.uint64(pseudo)
+	return k, total, pseudo
+
+def compare_sparse(tables, k):
+	"""Compares load_sparse() tables, returns the matrices of compare()
+
+	Only k-mers seen in some table get a column. Those seen in none add the
+	same term for each of them, so their share is added in one step.
+	"""
+	if any(t[0] is None for t in tables):
+		keys = np.arange(4 ** k, dtype=np.uint64)
+	else:
+		keys = np.unique(np.concatenate([t[0] for t in tables]))
+	P = np.empty((len(tables), len(keys)))
+	for i, (tkeys, probs, unseen) in enumerate(tables):
+		if tkeys is None:
+			P[i] = probs
+			continue
+		P[i] = unseen
+		P[i, np.searchsorted(keys, tkeys)] = probs
+	dkl, dtc = compare(P)
+	rest = 4 ** k - len(keys)
+	if rest:
+		u = np.array([t[2] for t in tables])
+		dkl += rest * u[:, None] * np.log2(u[:, None] / u[None, :])
+		dtc += rest * np.abs(u[:, None] - u[None, :])
+	return dkl, dtc
+
+def compare(P):
+	"""Returns N x N matrices of KL divergence and summed absolute difference
+
+	Rows of P are probability distributions. Terms where p is 0 contribute
+	nothing to KL(p||q); KL is infinite where q is 0 but p is not.
+	"""
+	L = np.zeros_like(P)
+	np.log2(P, out=L, where=P > 0)
+	dkl = np.zeros((len(P), len(P)))
+	dtc = np.zeros((len(P), len(P)))
+	for i in range(len(P)):
+		nz = P[i] > 0
+		dkl[i] = (P[i, nz] * (L[i, nz] - L[:, nz])).sum(axis=1)
+		dkl[i, (P[:, nz] == 0).any(axis=1)] = np.inf
+		dtc[i] = np.abs(P[i] - P).sum(axis=1)
+	return dkl, dtc
+
+def decode_many(keys, k):
+	"""Returns the k-mer strings of an array of indices"""
+	keys = np.asarray(keys, dtype=np.uint64)
+	shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+	codes = (keys[:, None] >> shifts) & np.uint64(3)
+	letters = np.frombuffer(ALPHABET.encode(), dtype=np.uint8)[codes]
+	return [b.decode() for b in letters.view(f'S{k}').ravel().tolist()]
+
+def write_sparse(fp, total, blocks, k, prob=False):
+	"""Writes a kmer<tab>value table of observed k-mers in index order"""
+	for keys, counts in blocks:
+		vals = counts / total if prob else counts
+		fp.write(''.join(f'{kmer}\t{v}\n'
+			for kmer, v in zip(decode_many(keys, k), vals.tolist())))
+
+def names(k):
+	"""Yields k-mer strings in index order"""
+	for t in itertools.product(ALPHABET, repeat=k): yield ''.join(t)
+
+def write_table(fp, values, k, prob=False):
+	"""Writes a kmer<tab>value table in index order, a block at a time"""
+	s = min(k, 8)
+	suffixes = list(names(s))
+	block = len(suffixes)
+	total = int(values.sum())
+	for i, prefix in enumerate(names(k - s)):
+		vals = values[i*block:(i+1)*block]
+		if prob: vals = vals / total
+		fp.write(''.join(f'{prefix}{suffix}\t{v}\n'
+			for suffix, v in zip(suffixes, vals.tolist())))
+
+def decode(idx, k):
+	"""Returns the k-mer string of an index"""
+	idx = int(idx)
+	nts = []
+	for _ in range(k):
+		nts.append(ALPHABET[idx & 3])
+		idx >>= 2
+	return ''.join(reversed(nts))
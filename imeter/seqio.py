@@ -0,0 +1,197 @@
+"""Fast bytes-based reading of plain, gzipped, and BGZF files
+
+chunks() yields a file as large blocks of bytes. Gzipped files are
+decompressed on a background thread, so decompression overlaps with whatever
+consumes the blocks. BGZF files (bgzip, samtools) are made of independent
+deflate blocks, which are decompressed in parallel by a thread pool; zlib
+releases the GIL, so this scales with cores.
+
+readfasta() splits those blocks into records on '\\n>' and strips newlines
+with bytes methods, instead of reading, stripping, and joining line by line.
+It yields (name, seq) like korflab.readfasta, with seq as bytes unless text
+is set. open_bytes() and getfp() wrap the same blocks as file objects.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import gzip
+import io
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+
+BLOCK = 1 << 22 # bytes per block read or yielded
+BGZF_BATCH = 256 # BGZF blocks (64 KB each at most) decompressed at a time
+
+def is_bgzf(file):
+	"""Returns True if file starts with a BGZF block header"""
+	with open(file, 'rb') as fp: head = fp.read(16)
+	return len(head) == 16 and head[:4] == b'\x1f\x8b\x08\x04' and \
+		head[12:14] == b'BC'
+
+def _plain(file, size):
+	if file == '-': fp = sys.stdin.buffer
+	else:           fp = open(file, 'rb')
+	try:
+		while True:
+			data = fp.read(size)
+			if not data: break
+			yield data
+	finally:
+		if fp is not sys.stdin.buffer: fp.close()
+
+def _threaded(blocks, depth=4):
+	"""Runs a block generator on a background thread, a few blocks ahead"""
+	q = queue.Queue(depth)
+	stop = threading.Event()
+	def produce():
+		try:
+			for data in blocks:
+				if stop.is_set(): break
+				q.put(data)
+			q.put(None)
+		except BaseException as e:
+			q.put(e)
+	thread = threading.Thread(target=produce, daemon=True)
+	thread.start()
+	try:
+		while True:
+			data = q.get()
+			if data is None: break
+			if isinstance(data, BaseException): raise data
+			yield data
+	finally:
+		stop.set()
+		while thread.is_alive(): # unblock the producer
+			try: q.get_nowait()
+			except queue.Empty: thread.join(0.01)
+
+def _gzip(file, size):
+	with gzip.open(file, 'rb') as fp:
+		while True:
+			data = fp.read(size)
+			if not data: break
+			yield data
+
+def _bgzf_blocks(file, size):
+	"""Yields lists of raw deflate payloads, one per BGZF block"""
+	with open(file, 'rb') as fp:
+		rest = b''
+		while True:
+			data = fp.read(size)
+			buf = rest + data
+			pos = 0
+			batch = []
+			while pos + 18 <= len(buf):
+				xlen = struct.unpack_from('<H', buf, pos + 10)[0]
+				bsize = struct.unpack_from('<H', buf, pos + 16)[0] + 1
+				if pos + bsize > len(buf): break
+				batch.append(buf[pos + 12 + xlen:pos + bsize - 8])
+				pos += bsize
+				if len(batch) == BGZF_BATCH:
+					yield batch
+					batch = []
+			if batch: yield batch
+			rest = buf[pos:]
+			if not data: break
+		if rest: raise ValueError(f'{file}: truncated BGZF block')
+
+def _inflate(payload):
+	return zlib.decompress(payload, -15)
+
+def _bgzf(file, size, threads):
+	with ThreadPoolExecutor(threads) as pool:
+		pending = collections.deque()
+		for batch in _bgzf_blocks(file, size):
+			pending.append(pool.map(_inflate, batch))
+			if len(pending) > 2: # keep two batches in flight
+				yield b''.join(pending.popleft())
+		while pending: yield b''.join(pending.popleft())
+
+def chunks(file, size=BLOCK, threads=None):
+	"""Yields the (decompressed) contents of file in blocks of bytes"""
+	if file == '-' or not file.endswith('.gz'):
+		yield from _plain(file, size)
+	elif is_bgzf(file):
+		yield from _bgzf(file, size, threads or os.cpu_count() or 1)
+	else:
+		yield from _threaded(_gzip(file, size))
+
+class _ChunkStream(io.RawIOBase):
+	"""Raw binary stream over a generator of byte blocks"""
+
+	def __init__(self, blocks):
+		self.blocks = blocks
+		self.data = memoryview(b'')
+
+	def readable(self):
+		return True
+
+	def readinto(self, b):
+		while not self.data:
+			block = next(self.blocks, None)
+			if block is None: return 0
+			self.data = memoryview(block)
+		n = min(len(b), len(self.data))
+		b[:n] = self.data[:n]
+		self.data = self.data[n:]
+		return n
+
+	def close(self):
+		if not self.closed: self.blocks.close()
+		super().close()
+
+def open_bytes(file, threads=None):
+	"""Returns a buffered binary file object over chunks(file)"""
+	return io.BufferedReader(_ChunkStream(chunks(file, threads=threads)),
+		BLOCK)
+
+def getfp(file):
+	"""Returns a text file object, like korflab.getfp"""
+	return io.TextIOWrapper(open_bytes(file))
+
+def _record(parts, text):
+	"""Returns (name, seq) for the pieces of one record, '>' removed"""
+	rec = parts[0] if len(parts) == 1 else b''.join(parts)
+	nl = rec.find(b'\n')
+	if nl < 0: nl = len(rec)
+	name = rec[:nl].rstrip().decode()
+	seq = rec[nl+1:].translate(None, b'\r\n')
+	return name, seq.decode() if text else seq
+
+def readfasta(file, text=False, threads=None):
+	"""Yields (name, seq) for each record of a FASTA file
+
+	name is the definition line without the '>', as in korflab.readfasta.
+	seq is bytes, or str if text is set.
+	"""
+	parts = None # pieces of the current record, None before the first '>'
+	rest = [] # pieces of an unfinished line
+	for block in chunks(file, threads=threads):
+		end = block.rfind(b'\n') + 1 # only split whole lines
+		if end == 0:
+			rest.append(block)
+			continue
+		data = b''.join(rest + [block[:end]]) if rest else block[:end]
+		rest = [block[end:]] if end < len(block) else []
+		new = data.startswith(b'>')
+		pieces = (data[1:] if new else data).split(b'\n>')
+		if new:
+			if parts: yield _record(parts, text)
+			parts = [pieces[0]]
+		elif parts is not None:
+			parts.append(pieces[0])
+		for piece in pieces[1:]:
+			if parts: yield _record(parts, text)
+			parts = [piece]
+	rest = b''.join(rest)
+	if rest:
+		if rest.startswith(b'>'):
+			if parts: yield _record(parts, text)
+			parts = [rest[1:]]
+		elif parts is not None:
+			parts.append(rest)
+	if parts: yield _record(parts, text)
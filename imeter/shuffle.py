@@ -0,0 +1,64 @@
+"""Sequence shuffling, optionally preserving k-let composition
+
+shuffle() permutes the bases of a sequence with NumPy. kshuffle() preserves
+the counts of every k-mer (k=2 keeps dinucleotide counts) with the Euler path
+method of Altschul and Erickson, as generalized by uShuffle: pick a random
+spanning arborescence of last edges in the (k-1)-mer graph, shuffle the
+remaining edges, then walk the graph. Both run in linear time.
+"""
+
+import numpy as np
+
+def shuffle(seq, rng):
+	"""Returns the bases of seq (bytes) in random order"""
+	buf = np.frombuffer(seq, dtype=np.uint8).copy()
+	rng.shuffle(buf)
+	return buf.tobytes()
+
+def kshuffle(seq, k, rng):
+	"""Returns a random sequence (bytes) with the same k-mer counts as seq"""
+	if k <= 1: return shuffle(seq, rng)
+	l = k - 1
+	if len(seq) <= k: return seq
+
+	# number the (k-1)-mers and collect the out-edges of each one
+	ids = {}
+	path = []
+	for i in range(len(seq) - l + 1):
+		path.append(ids.setdefault(seq[i:i+l], len(ids)))
+	edges = [[] for _ in ids]
+	for i in range(len(path) - 1):
+		edges[path[i]].append(path[i+1])
+
+	# random arborescence of last edges, rooted at the final vertex
+	last = path[-1]
+	nxt = [-1] * len(ids)
+	intree = [False] * len(ids)
+	intree[last] = True
+	for v in range(len(ids)):
+		u = v
+		while not intree[u]:
+			nxt[u] = int(rng.integers(len(edges[u])))
+			u = edges[u][nxt[u]]
+		u = v
+		while not intree[u]:
+			intree[u] = True
+			u = edges[u][nxt[u]]
+
+	# shuffle all other edges, then use the last edge last
+	for v, out in enumerate(edges):
+		if len(out) == 0: continue
+		if nxt[v] >= 0: out[nxt[v]], out[-1] = out[-1], out[nxt[v]]
+		head = len(out) - 1 if nxt[v] >= 0 else len(out)
+		perm = rng.permutation(head)
+		out[:head] = [out[j] for j in perm.tolist()]
+		out.reverse() # pop() from the end
+
+	kmers = [None] * len(ids)
+	for kmer, i in ids.items(): kmers[i] = kmer
+	u = path[0]
+	result = bytearray(kmers[u])
+	for _ in range(len(path) - 1):
+		u = edges[u].pop()
+		result.append(kmers[u][-1])
+	return bytes(result)
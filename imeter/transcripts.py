@@ -0,0 +1,160 @@
+"""Indexed, array-backed transcript models built from GFF exon records
+
+The first time a GFF is loaded, its exons are parsed into compact columns and
+written to a binary index next to the GFF (e.g. Araport11.gff.gz.txi). Later
+loads memory-map the index instead of re-parsing the annotation. If the GFF's
+directory is read-only, the index goes to the same cache directory as the
+genome files (see genome.cache_path), and if that fails too the exons are
+kept in memory.
+"""
+
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+import genome
+import seqio
+
+MAGIC = b'IMETXI01'
+VERSION = 1
+COLUMNS = (
+	('chrom', 'uint16'),  # exon -> chromosome number
+	('tid', 'uint32'),    # exon -> transcript number
+	('beg', 'uint32'),    # exon begin (1-based, inclusive)
+	('end', 'uint32'),    # exon end (1-based, inclusive)
+	('strand', 'uint8'),  # exon strand as ASCII '+' or '-'
+	('offset', 'uint32'), # transcript -> first exon (n+1 entries)
+)
+
+def _stamp(path):
+	st = os.stat(path)
+	return {'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+def parse_gff(gff):
+	"""Parses exon records from a GFF into column arrays and name tables"""
+	by_chrom = {}
+	fp = seqio.getfp(gff)
+	for line in fp:
+		if line.startswith('#'): continue
+		f = line.split('\t')
+		if f[2] != 'exon': continue
+		chrom = f[0]
+		if chrom not in by_chrom: by_chrom[chrom] = {}
+		tid = f[8].split(';')[2][7:]
+		if tid not in by_chrom[chrom]: by_chrom[chrom][tid] = []
+		by_chrom[chrom][tid].append((int(f[3]), int(f[4]), f[6]))
+	fp.close()
+
+	chroms = list(by_chrom)
+	tids = []
+	cols = {name: [] for name, _ in COLUMNS}
+	for c, chrom in enumerate(chroms):
+		for tid, exons in by_chrom[chrom].items():
+			t = len(tids)
+			tids.append(tid)
+			cols['offset'].append(len(cols['beg']))
+			for beg, end, strand in exons:
+				cols['chrom'].append(c)
+				cols['tid'].append(t)
+				cols['beg'].append(beg)
+				cols['end'].append(end)
+				cols['strand'].append(ord(strand))
+	cols['offset'].append(len(cols['beg']))
+
+	arrays = {name: np.array(cols[name], dtype=dtype) for name, dtype in COLUMNS}
+	return chroms, tids, arrays
+
+def write_index(path, source, chroms, tids, arrays):
+	"""Writes columns to a binary index (atomically, via a temp file)"""
+	layout = {}
+	offset = 0
+	for name, dtype in COLUMNS:
+		layout[name] = [dtype, offset, len(arrays[name])]
+		offset += arrays[name].nbytes
+		offset += -offset % 8
+	header = json.dumps({
+		'version': VERSION,
+		'source': _stamp(source),
+		'chroms': chroms,
+		'tids': tids,
+		'columns': layout,
+	}).encode()
+	header += b' ' * (-(len(MAGIC) + 8 + len(header)) % 8)
+
+	def write(fp):
+		fp.write(MAGIC)
+		fp.write(struct.pack('<Q', len(header)))
+		fp.write(header)
+		for name, _ in COLUMNS:
+			data = arrays[name].tobytes()
+			fp.write(data)
+			fp.write(b'\0' * (-len(data) % 8))
+	genome.atomic_write(path, write)
+
+def read_index(path, source=None):
+	"""Memory-maps a binary index, returns None if missing or stale"""
+	try: fp = open(path, 'rb')
+	except FileNotFoundError: return None
+	with fp:
+		if fp.read(len(MAGIC)) != MAGIC: return None
+		size, = struct.unpack('<Q', fp.read(8))
+		header = json.loads(fp.read(size))
+		if header['version'] != VERSION: return None
+		if source is not None and header['source'] != _stamp(source):
+			return None
+		mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+	base = len(MAGIC) + 8 + size
+	arrays = {}
+	for name, (dtype, offset, n) in header['columns'].items():
+		arrays[name] = np.frombuffer(mm, dtype=dtype, count=n,
+			offset=base + offset)
+	return header['chroms'], header['tids'], arrays
+
+class TranscriptModel:
+	"""Exons of every transcript in a GFF, stored as parallel columns"""
+
+	def __init__(self, gff, index=None, rebuild=False):
+		if index is None: index = f'{gff}.txi'
+		paths = (index, genome.cache_path(index))
+		loaded = None
+		if not rebuild:
+			for path in paths:
+				loaded = read_index(path, gff)
+				if loaded is not None: break
+		if loaded is None:
+			loaded = parse_gff(gff)
+			for path in paths:
+				try:
+					os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+					write_index(path, gff, *loaded)
+					break
+				except OSError:
+					continue # read-only, try the cache or keep it in memory
+		self.chroms, self.tids, arrays = loaded
+		self.chrom = arrays['chrom']
+		self.tid = arrays['tid']
+		self.beg = arrays['beg']
+		self.end = arrays['end']
+		self.strand = arrays['strand']
+		self.offset = arrays['offset']
+		self._chromidx = {c: i for i, c in enumerate(self.chroms)}
+
+	def __len__(self):
+		return len(self.tids)
+
+	def __contains__(self, chrom):
+		return chrom in self._chromidx
+
+	def transcripts(self, chrom):
+		"""Yields (tid, begs, ends, strands) for each transcript on chrom"""
+		if chrom not in self._chromidx: return
+		c = self._chromidx[chrom]
+		first = self.offset[:-1]
+		txs = np.flatnonzero(self.chrom[first] == c)
+		for t in txs.tolist():
+			a = int(self.offset[t])
+			b = int(self.offset[t+1])
+			yield (self.tids[t], self.beg[a:b].tolist(),
+				self.end[a:b].tolist(), self.strand[a:b].tobytes().decode())
@@ -1,10 +1,45 @@
 import argparse
-import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
 import korflab
+import instrument
+import seqio
 
+def positions(seq, motif):
+	"""Returns the positions of a dinucleotide in seq[20:len(seq)-20]"""
+	buf = np.frombuffer(seq.encode(), dtype=np.uint8)
+	hit = (buf[:-1] == ord(motif[0])) & (buf[1:] == ord(motif[1]))
+	return np.flatnonzero(hit[20:len(buf)-20]) + 20
+
+def sample(file, n, size, donor, anti, seed):
+	"""Returns (sites, total), a uniform sample of n sites by reservoir"""
+	rng = np.random.default_rng(seed)
+	motif = 'GT' if donor else 'AG'
+	sites = []
+	total = 0
+	for defline, seq in seqio.readfasta(file, text=True):
+		if anti: seq = korflab.anti(seq)
+		pos = positions(seq, motif)
+		if len(sites) < n: # fill the reservoir
+			fill = pos[:n - len(sites)]
+			pos = pos[len(fill):]
+			total += len(fill)
+			for i in fill.tolist():
+				sites.append(seq[i:i+size] if donor else seq[i-size+2:i+2])
+		if len(pos) == 0: continue
+
+		# candidate j replaces a random slot with probability n/(total+j+1)
+		slot = rng.integers(0, total + np.arange(1, len(pos) + 1))
+		total += len(pos)
+		keep = np.flatnonzero(slot < n)
+		for i, s in zip(pos[keep].tolist(), slot[keep].tolist()):
+			sites[s] = seq[i:i+size] if donor else seq[i-size+2:i+2]
+	return sites, total
 
 parser = argparse.ArgumentParser()
-parser.add_argument('introns', help='fasta file of introns')
+parser.add_argument('introns', nargs='+', help='fasta file(s) of introns')
 parser.add_argument('seqs', type=int, help='number of sequences to make')
 parser.add_argument('size', type=int, help='length of decoy site')
 parser.add_argument('--donor', action='store_true',
@@ -13,16 +48,39 @@ parser.add_argument('--acceptor', action='store_true',
 	help='make acceptor sites')
 parser.add_argument('--anti', action='store_true',
 	help='generate from opposite strand')
+parser.add_argument('--seed', type=int, metavar='<int>',
+	help='set random seed')
+parser.add_argument('--jobs', type=int, default=1, metavar='<int>',
+	help='number of files sampled in parallel [%(default)i]')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+if not (arg.donor or arg.acceptor): parser.error('need --donor or --acceptor')
+rec = instrument.start(arg)
+
+# each file gets its own reservoir and child seed
+ss = np.random.SeedSequence(arg.seed)
+seeds = ss.spawn(len(arg.introns))
+args = [(f, arg.seqs, arg.size, arg.donor, arg.anti, s)
+	for f, s in zip(arg.introns, seeds)]
+with rec.phase('sample'):
+	if arg.jobs > 1 and len(args) > 1:
+		with ProcessPoolExecutor(arg.jobs, mp_context=get_context('fork')) \
+				as pool:
+			parts = list(pool.map(sample, *zip(*args)))
+	else:
+		parts = [sample(*a) for a in args]
 
+# draw how many sites come from each file, in proportion to its total
+rng = np.random.default_rng(ss.generate_state(1))
+totals = [total for _, total in parts]
+n = min(arg.seqs, sum(totals))
+if n < arg.seqs:
+	print(f'only {n} sites found, {arg.seqs} requested', file=sys.stderr)
+take = rng.multivariate_hypergeometric(totals, n)
 sites = []
-for defline, seq in korflab.readfasta(arg.introns):
-	if arg.anti: seq = korflab.anti(seq)
-	for i in range(20, len(seq) -20):
-		if arg.donor:
-			if seq[i:i+2] == 'GT': sites.append(seq[i:i+arg.size])
-		elif arg.acceptor:
-			if seq[i:i+2] == 'AG': sites.append(seq[i-arg.size+2:i+2])
+for (part, _), m in zip(parts, take.tolist()):
+	sites.extend(part[j] for j in rng.choice(len(part), m, replace=False))
 
-random.shuffle(sites)
-for i in range(arg.seqs): print(sites[i])
\ No newline at end of file
+rec.count(len(sites), len(sites) * arg.size)
+with rec.phase('write'):
+	for i in rng.permutation(len(sites)).tolist(): print(sites[i])
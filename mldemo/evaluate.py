@@ -0,0 +1,82 @@
+"""Evaluation of a classifier from the scores of positive and negative sets
+
+Each set is scored once into an array. A single sort of the pooled scores
+gives every point of the ROC and precision-recall curves, from which the
+areas and the most accurate threshold follow. A sequence is called
+positive if its score is greater than the threshold.
+"""
+
+import numpy as np
+
+def curve(pos, neg):
+	"""Returns (thresholds, tp, fp) at each distinct cutoff, most strict first
+
+	Calling scores > thresholds[i] positive gives tp[i] true positives and
+	fp[i] false positives. Thresholds fall halfway between adjacent scores.
+	"""
+	scores = np.concatenate((pos, neg)).astype(float)
+	if len(scores) == 0: return np.array([np.inf]), np.zeros(1), np.zeros(1)
+	labels = np.concatenate((np.ones(len(pos)), np.zeros(len(neg))))
+	order = np.argsort(-scores, kind='stable')
+	scores, labels = scores[order], labels[order]
+	last = np.append(np.flatnonzero(np.diff(scores)), len(scores) - 1)
+	tp = np.concatenate(([0], np.cumsum(labels)[last]))
+	fp = np.concatenate(([0], last + 1 - tp[1:]))
+	below = np.append(scores[last[:-1] + 1], -np.inf)
+	thresholds = np.concatenate((scores[:1], (scores[last] + below) / 2))
+	return thresholds, tp, fp
+
+def area(x, y):
+	"""Returns the area under a curve by the trapezoid rule"""
+	return float(np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2))
+
+def summary(pos, neg):
+	"""Returns a dict of ROC AUC, average precision, and best threshold"""
+	thresholds, tp, fp = curve(pos, neg)
+	P, N = len(pos), len(neg)
+	tpr = tp / P if P else np.zeros(len(tp))
+	fpr = fp / N if N else np.zeros(len(fp))
+	called = np.maximum(tp + fp, 1)
+	acc = (tp + N - fp) / max(P + N, 1)
+	best = int(np.argmax(acc))
+	return {
+		'roc_auc': area(fpr, tpr),
+		'pr_auc': float(np.sum(np.diff(tpr) * (tp / called)[1:])),
+		'threshold': float(thresholds[best]),
+		'accuracy': float(acc[best]),
+	}
+
+def confusion(pos, neg, threshold=0):
+	"""Returns (tp, tn, fp, fn) calling scores > threshold positive"""
+	tp = int((np.asarray(pos) > threshold).sum())
+	fp = int((np.asarray(neg) > threshold).sum())
+	return tp, len(neg) - fp, fp, len(pos) - tp
+
+def report(pos, neg, threshold=0, curve_file=None):
+	"""Prints the confusion matrix at threshold and the summary statistics"""
+	tp, tn, fp, fn = confusion(pos, neg, threshold)
+	print('True Positives:', tp)
+	print('True Negatives:', tn)
+	print('False Positives:', fp)
+	print('False Negatives:', fn)
+	print('Accuracy:', (tp+tn) / (tp+tn+fp+fn))
+	s = summary(pos, neg)
+	print('ROC AUC:', s['roc_auc'])
+	print('PR AUC:', s['pr_auc'])
+	print('Best Threshold:', s['threshold'])
+	print('Best Accuracy:', s['accuracy'])
+	if curve_file: write_curve(curve_file, pos, neg)
+
+def write_curve(file, pos, neg):
+	"""Writes the ROC and precision-recall points as a table"""
+	thresholds, tp, fp = curve(pos, neg)
+	tpr = tp / max(len(pos), 1)
+	fpr = fp / max(len(neg), 1)
+	precision = np.divide(tp, tp + fp, out=np.ones(len(tp)), where=tp + fp > 0)
+	with open(file, 'w') as out:
+		print('threshold', 'tp', 'fp', 'tpr', 'fpr', 'precision', sep='\t',
+			file=out)
+		for row in zip(thresholds.tolist(), tp.astype(int).tolist(),
+				fp.astype(int).tolist(), tpr.tolist(), fpr.tolist(),
+				precision.tolist()):
+			print(*row, sep='\t', file=out)
@@ -1,7 +1,26 @@
 import argparse
-import random
 import re
-import korflab
+import sys
+import numpy as np
+import instrument
+import seqio
+
+BATCH = 1 << 16 # windows drawn and written at a time
+
+def windows(buf, ends, length, n, rng, within=False):
+	"""Yields n x length byte matrices of random windows, in batches
+
+	Sequences are stored back to back in buf and ends holds their cumulative
+	lengths. With within, windows that cross into the next sequence are
+	rejected, which leaves the rest uniform over the windows that don't.
+	"""
+	while n > 0:
+		pos = rng.integers(0, len(buf) - length + 1, size=min(n, BATCH))
+		if within:
+			seq = np.searchsorted(ends, pos, side='right')
+			pos = pos[pos + length <= ends[seq]]
+		n -= len(pos)
+		yield buf[pos[:, None] + np.arange(length)]
 
 parser = argparse.ArgumentParser()
 parser.add_argument('fasta', help='exons file')
@@ -11,24 +30,34 @@ parser.add_argument('--length', type=int, default=50,
 	help='length of exons [%(default)i]')
 parser.add_argument('--introns', action='store_true',
 	help='remove splice sites from ends of sequences')
+parser.add_argument('--within', action='store_true',
+	help='only draw windows that lie within a single sequence')
+parser.add_argument('--seed', type=int, metavar='<int>',
+	help='set random seed')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-seqs = []
-
-for defline, seq in korflab.readfasta(arg.fasta):
-	if not re.match('^[ACGT]+$', seq): continue
-	if arg.introns: seqs.append(seq[10:-10])
-	else:           seqs.append(seq)
-
-seq = ''.join(seqs)
-cds = []
-for _ in range(arg.seqs):
-	pos = random.randint(0, len(seq) - arg.length)
-	cds.append(seq[pos:pos+arg.length])
-
-random.shuffle(cds)
+buf = bytearray()
+ends = []
+longest = 0
+with rec.phase('load'):
+	for defline, seq in rec.tally(seqio.readfasta(arg.fasta)):
+		if not re.match(b'^[ACGT]+$', seq): continue
+		if arg.introns: seq = seq[10:-10]
+		buf += seq
+		ends.append(len(buf))
+		longest = max(longest, len(seq))
+buf = np.frombuffer(bytes(buf), dtype=np.uint8)
+ends = np.array(ends, dtype=np.int64)
 
-for i in range(arg.seqs):
-	if i == arg.seqs: break
-	print(cds[i])
+if arg.within and longest < arg.length:
+	sys.exit(f'no sequence is at least {arg.length} long')
+if len(buf) < arg.length: sys.exit(f'less than {arg.length} bases in total')
 
+rng = np.random.default_rng(arg.seed)
+newline = np.full((1, 1), ord('\n'), dtype=np.uint8)
+with rec.phase('write'):
+	for rows in windows(buf, ends, arg.length, arg.seqs, rng, arg.within):
+		rows = np.hstack((rows, np.broadcast_to(newline, (len(rows), 1))))
+		sys.stdout.buffer.write(rows.tobytes())
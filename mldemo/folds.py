@@ -0,0 +1 @@
+../imeter/folds.py
\ No newline at end of file
@@ -0,0 +1 @@
+../imeter/instrument.py
\ No newline at end of file
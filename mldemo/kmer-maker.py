@@ -4,33 +4,44 @@ import math
 import re
 import sys
 import korflab
+import instrument
+import kmers
 
-def readseqs(file, k):
-	kmers = {}
+def readseqs(file, k, rec=instrument.OFF):
+	counts = {}
 	for t in itertools.product('ACGT', repeat=k):
-		kmers[''.join(t)] = 1 # pseudo-count added
+		counts[''.join(t)] = 1 # pseudo-count added
 	total = 0
 	with open(file) as fp:
-		for line in fp:
-			seq = line.rstrip()
+		for seq in rec.tally(line.rstrip() for line in fp):
 			for i in range(len(seq) -k + 1):
 				kmer = seq[i:i+k]
 				if not re.match('^[ACGT]+$', kmer): continue
-				if kmer not in kmers: continue
+				if kmer not in counts: continue
 				total += 1
-				kmers[kmer] += 1
-	if len(kmers) != 4**k: sys.exit('k appears to be too high')
+				counts[kmer] += 1
+	if len(counts) != 4**k: sys.exit('k appears to be too high')
 	kprob = {}
-	for k, v in sorted(kmers.items()): kprob[k] = v/total
+	for kmer, v in sorted(counts.items()): kprob[kmer] = v/total
 	return kprob
 
 parser = argparse.ArgumentParser()
 parser.add_argument('exons', help='file of exon sequences')
 parser.add_argument('introns', help='file of intron sequences')
 parser.add_argument('k', type=int, help='size of kmer')
+parser.add_argument('--binary', action='store_true',
+	help='write a binary log-odds profile instead of a text table')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-kex = readseqs(arg.exons, arg.k)
-kin = readseqs(arg.introns, arg.k)
-for kmer in kex:
-	print(kmer, math.log2(kex[kmer]/kin[kmer]))
+with rec.phase('count'):
+	kex = readseqs(arg.exons, arg.k, rec)
+	kin = readseqs(arg.introns, arg.k, rec)
+with rec.phase('write'):
+	if arg.binary:
+		lod = [math.log2(kex[kmer]/kin[kmer]) for kmer in kex]
+		kmers.write_profile(sys.stdout.buffer, lod, arg.k, 'logodds', pseudo=1)
+	else:
+		for kmer in kex:
+			print(kmer, math.log2(kex[kmer]/kin[kmer]))
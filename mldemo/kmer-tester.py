@@ -1,47 +1,40 @@
 import argparse
+import sys
+import numpy as np
 import korflab
+import instrument
+import kmers
+import evaluate
 
 def readseq(file):
 	with open(file) as fp:
 		for line in fp: yield line.rstrip()
 
 def score_model(model, seq, k):
-	s = 0
-	for i in range(len(seq) -k + 1):
-		kmer = seq[i:i+k]
-		if kmer in model: s += model[kmer]
-	return s
+	return model[kmers.kmer_index(kmers.encode(seq), k)].sum()
+
+def score_file(model, file, k, rec=instrument.OFF):
+	"""Returns the score of every sequence in a file as an array"""
+	return np.fromiter((score_model(model, seq, k)
+		for seq in rec.tally(readseq(file))), dtype=float)
 
 parser = argparse.ArgumentParser()
-parser.add_argument('model', help='exon-intron log-odds model')
+parser.add_argument('model', help='exon-intron log-odds table or profile')
 parser.add_argument('exons', help='exons')
 parser.add_argument('introns', help='introns')
+parser.add_argument('--threshold', type=float, default=0, metavar='<float>',
+	help='exon if score is greater than this [%(default)g]')
+parser.add_argument('--curve', metavar='<path>',
+	help='write ROC and precision-recall points to this file')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-model = {}
-k = None
-with open(arg.model) as fp:
-	for line in fp:
-		kmer, val = line.split()
-		model[kmer] = float(val)
-		if k is None: k = len(kmer)
-
-tp = 0
-fp = 0
-tn = 0
-fn = 0
-for seq in readseq(arg.exons):
-	s = score_model(model, seq, k)
-	if s > 0: tp += 1
-	else:     fn += 1
-
-for seq in readseq(arg.introns):
-	s = score_model(model, seq, k)
-	if s > 0: fp += 1
-	else:     tn += 1
-
-print('True Positives:', tp)
-print('True Negatives:', tn)
-print('False Positives:', fp)
-print('False Negatives:', fn)
-print('Accuracy:', (tp+tn) / (tp+tn+fp+fn))
+try:
+	with rec.phase('load'): k, model = kmers.load(arg.model, 'logodds')
+except ValueError as e: sys.exit(str(e))
+with rec.phase('score'):
+	escores = score_file(model, arg.exons, k, rec)
+	iscores = score_file(model, arg.introns, k, rec)
+with rec.phase('write'):
+	evaluate.report(escores, iscores, arg.threshold, arg.curve)
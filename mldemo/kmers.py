@@ -0,0 +1 @@
+../imeter/kmers.py
\ No newline at end of file
@@ -1,205 +1,241 @@
 #!/usr/bin/env python3
 
 import argparse
-import gzip
-import itertools
-import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 import os
 import statistics
 import sys
 
-from numpy import vstack
-from pandas import read_csv
-
-from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import accuracy_score, f1_score
-
-import torch
-from torch.utils.data import Dataset
-from torch.utils.data import DataLoader
-from torch.utils.data import random_split
-from torch import Tensor
-from torch.nn import Linear
-from torch.nn import ReLU
-from torch.nn import Sigmoid
-from torch.nn import Module, ModuleList
-from torch.optim import SGD
-from torch.nn import BCELoss
-from torch.nn.init import kaiming_uniform_
-from torch.nn.init import xavier_uniform_
-
-class CSVDataset(Dataset):
-
-	def __init__(self, path):
-		df = read_csv(path, header=None) # load the csv file as a dataframe
-		self.X = df.values[:, :-1] # store the inputs
-		self.y = df.values[:, -1]  # and outputs
-		self.X = self.X.astype('float32') # ensure input data is floats
-		self.y = LabelEncoder().fit_transform(self.y) # label target
-		self.y = self.y.astype('float32') # ensure floats
-		self.y = self.y.reshape((len(self.y), 1))
-
-	def __len__(self):
-		return len(self.X)
-
-	def __getitem__(self, idx):
-		return [self.X[idx], self.y[idx]]
-
-	def get_splits(self, n_test):
-		test_size = round(n_test * len(self.X))
-		train_size = len(self.X) - test_size
-		return random_split(self, (train_size, test_size))
-
-class MLP(Module):
-
-	def __init__(self, n_inputs, layers):
-		super(MLP, self).__init__()
-
-		self.hidden = ModuleList()
-		self.act = ModuleList()
-		for i in range(1, len(layers)):
-			input = layers[i-1]
-			output = layers[i]
-			self.hidden.append(Linear(input, output))
-
-		for i in range(len(self.hidden) -1):
-			kaiming_uniform_(self.hidden[i].weight, nonlinearity='relu')
-			self.act.append(ReLU())
-		xavier_uniform_(self.hidden[-1].weight)
-		self.act.append(Sigmoid())
-
-	def forward(self, X):
-		for hidden, act in zip(self.hidden, self.act):
-			X = hidden(X)
-			X = act(X)
-		return X
-
-def prepare_data(path, split):
-	dataset = CSVDataset(path)
-	train, test = dataset.get_splits(split)
-	# why are the batch sizes hard-coded?
-	train_dl = DataLoader(train, batch_size=32, shuffle=True)
-	test_dl = DataLoader(test, batch_size=1024, shuffle=False)
-	return train_dl, test_dl
-
-def train_model(train_dl, model, r, m):
-	criterion = BCELoss() # or CrossEntropyLoss, MSELoss
-	optimizer = SGD(model.parameters(), lr=r, momentum=m) # or Adam
-	for epoch in range(50):
-		for i, (inputs, targets) in enumerate(train_dl): # mini batches
-			optimizer.zero_grad() # clear the gradients
-			yhat = model(inputs) # compute the model output
-			loss = criterion(yhat, targets) # calculate loss
-			loss.backward() # credit assignment
-			optimizer.step() # update model weights
-
-def evaluate_model(test_dl, model):
-	predictions, actuals = list(), list()
-	for i, (inputs, targets) in enumerate(test_dl):
-		yhat = model(inputs) # evaluate the model on the test set
-		yhat = yhat.detach().numpy() # retrieve numpy array
-		actual = targets.numpy()
-		actual = actual.reshape((len(actual), 1))
-		yhat = yhat.round() # round to class values
-		predictions.append(yhat) # store
-		actuals.append(actual)
-
-	predictions, actuals = vstack(predictions), vstack(actuals)
-	acc = accuracy_score(actuals, predictions)
-	f1 = f1_score(actuals, predictions, average='weighted')
-	return acc, f1
-
-def predict(row, model):
-	row = Tensor([row]) # convert row to data (can be tuple)
-	yhat = model(row) # make prediction
-	yhat = yhat.detach().numpy() # retrieve numpy array
-	return yhat
-
-def ntencoder(file, label=None, binary=False):
-	"""One-hot/binary encodes a sequence file, optionally with terminal label"""
-	encoding = {'A':'0001', 'C':'0010', 'G':'0100', 'T':'1000'}
-	if binary: encoding = {'A':'00', 'C':'01', 'G':'10', 'T':'11'}
-
-	data = []
-	with open(file) as fp:
-		for line in fp:
-			seq = line.rstrip()
-			s = [encoding[nt] for nt in seq]
-			s = ''.join(s)
-			if label: s += str(label)
-			data.append(s)
-	return data
+import numpy as np
+import instrument
+
+network = None # network.py, imported once torch is needed
+
+ONEHOT = np.array([[0,0,0,1], [0,0,1,0], [0,1,0,0], [1,0,0,0]], dtype=np.uint8)
+BINARY = np.array([[0,0], [0,1], [1,0], [1,1]], dtype=np.uint8)
+NTCODE = np.full(256, 255, dtype=np.uint8)
+for i, nt in enumerate(b'ACGT'): NTCODE[nt] = i
+
+def ntencoder(file, binary=False):
+	"""One-hot/binary encodes a file of fixed-length sequences to uint8 rows"""
+	with open(file, 'rb') as fp:
+		seqs = fp.read().split()
+	if len(set(len(seq) for seq in seqs)) > 1:
+		raise Exception(f'{file}: sequences are not all the same length')
+	length = len(seqs[0]) if seqs else 0
+	codes = NTCODE[np.frombuffer(b''.join(seqs), dtype=np.uint8)]
+	if np.any(codes == 255): raise Exception(f'{file}: non-ACGT sequence')
+	table = BINARY if binary else ONEHOT
+	return table[codes].reshape(len(seqs), length * table.shape[1])
 
 def cross_validation(seqs, x):
 	"""Generates cross-validation sets"""
+	seqs = np.asarray(seqs)
+	fold = np.arange(len(seqs)) % x
 	for i in range(x):
-		train = []
-		test = []
-		for j in range(len(seqs)):
-			if j % x == i: test.append(seqs[j])
-			else:          train.append(seqs[j])
-		yield train, test
+		yield seqs[fold != i], seqs[fold == i]
+
+def report_folds(results):
+	"""Prints accuracy and AUC of each fold as it ends, returns (accs, state)"""
+	accs = []
+	state = None
+	for acc, f1, stats, state in results:
+		print(f'{acc:.3f}', f'{stats["roc_auc"]:.3f}', sep='\t',
+			file=sys.stderr, flush=True)
+		accs.append(acc)
+	return accs, state
+
+def site_starts(seq, acceptor=False, length=10):
+	"""Returns start positions of windows at every GT (or AG) dinucleotide"""
+	a, b = (b'A', b'G') if acceptor else (b'G', b'T')
+	arr = np.frombuffer(seq, dtype=np.uint8)
+	pos = np.flatnonzero((arr[:-1] == ord(a)) & (arr[1:] == ord(b)))
+	starts = pos - length + 2 if acceptor else pos
+	return starts[(starts >= 0) & (starts + length <= len(arr))]
+
+def scan_sequence(model, seq, length, acceptor=False, binary=False,
+		batch=65536):
+	"""Yields (starts, scores) for batches of candidate sites in seq (bytes)"""
+	table = BINARY if binary else ONEHOT
+	codes = NTCODE[np.frombuffer(seq, dtype=np.uint8)]
+	starts = site_starts(seq, acceptor, length)
+	offsets = np.arange(length)
+	for i in range(0, len(starts), batch):
+		s = starts[i:i+batch]
+		w = codes[s[:, None] + offsets]
+		ok = np.all(w != 255, axis=1) # skip windows with non-ACGT
+		s, w = s[ok], w[ok]
+		if len(s) == 0: continue
+		yield s, network.predict(table[w].reshape(len(s), -1), model).ravel()
+
+def scan(arg, rec=instrument.OFF):
+	global network
+	with rec.phase('load'):
+		import network
+		import seqio
+		if arg.threads: network.torch.set_num_threads(arg.threads)
+		model, layers = network.load_model(arg.model)
+	length = layers[0] // (2 if arg.binary else 4)
+	comp = bytes.maketrans(b'ACGTacgt', b'TGCAtgca')
+	with rec.phase('score'):
+		for name, seq in rec.tally(seqio.readfasta(arg.fasta)):
+			name = name.split()[0]
+			fwd = seq.upper()
+			for strand, s in (('+', fwd), ('-', fwd.translate(comp)[::-1])):
+				for starts, scores in scan_sequence(model, s, length,
+						arg.acceptor, arg.binary, arg.batch):
+					keep = scores >= arg.threshold
+					if strand == '-': starts = len(s) - starts - length
+					sys.stdout.write(''.join(
+						f'{name}\t{b}\t{b + length}\t.\t{v:.4f}\t{strand}\n'
+						for b, v in zip(starts[keep].tolist(),
+							scores[keep].tolist())))
 
 
 #########
 ## CLI ##
 #########
 
-parser = argparse.ArgumentParser(
-	description='fun with neural networks')
-parser.add_argument('pos', help='positive, real sequences')
-parser.add_argument('neg', help='negative, fake sequences')
-parser.add_argument('layers', type=int, nargs='*', metavar='<int>',
-	help='nodes in each hidden layer, e.g. 40 1 or 200 1')
-parser.add_argument('--limit', type=int, metavar='<int>',
-	help='limit the data set size to this amount for testing')
-parser.add_argument('--xvalid', type=int, default=2, metavar='<int>',
-	help='x-fold cross-validation [%(default)s]')
-parser.add_argument('--rate', type=float, default=0.01,
-	metavar='<float>', help='learning rate [%(default)f]')
-parser.add_argument('--momentum', type=float, default=0.9,
-	metavar='<float>', help='momentum [%(default)f]')
-parser.add_argument('--seed', type=int, metavar='<int>',
-	help='set random seed')
-parser.add_argument('--save', type=str, metavar='<path>',
-	help='where to save the model', default=None)
-arg = parser.parse_args()
-
-if arg.seed: torch.manual_seed(arg.seed)
-
-# read sequence files and convert to a single one-hot encoded csv
-s1 = ntencoder(arg.pos, label='1')
-s0 = ntencoder(arg.neg, label='0')
-if arg.limit: seqs = s1[:arg.limit] + s0[:arg.limit]
-else:         seqs = s1 + s0
-random.shuffle(seqs)
-csv = f'temp.{os.getpid()}.csv'
-with open(csv, 'w') as fp:
-	for item in seqs:
-		fp.write(','.join(item))
-		fp.write('\n')
-size = len(s1[0]) -1 # length of sequence
-
-# check network architecture
-if len(arg.layers) < 2: raise Exception('need at least 2 layers')
-if arg.layers[0] != size: raise Exception('input layer != inputs')
-if arg.layers[-1] != 1: raise Exception('last layer must be 1')
-
-# train, test, evaluate model
-accs = []
-for i in range(arg.xvalid):
-	train_dl, test_dl = prepare_data(csv, 0.25)
-	model = MLP(size, arg.layers)
-	train_model(train_dl, model, arg.rate, arg.momentum)
-	acc, f1 = evaluate_model(test_dl, model)
-	print(f'{acc:.3f}', file=sys.stderr, flush=True)
-	accs.append(acc)
-
-if arg.save != None: torch.save(model.state_dict(), arg.save)
-
-# report aggregate performance
-os.remove(csv)
-print(statistics.mean(accs))
-
-
-
+def scan_parser():
+	parser = argparse.ArgumentParser(prog='mlp.py scan',
+		description='score every GT (or AG) site in a FASTA file, on both '
+		'strands, with a saved model, writing BED-like lines')
+	parser.add_argument('model', help='model saved with --save')
+	parser.add_argument('fasta', help='sequences to scan, e.g. a genome')
+	parser.add_argument('--acceptor', action='store_true',
+		help='scan AG acceptor sites (window ends in AG) instead of donors')
+	parser.add_argument('--binary', action='store_true',
+		help='model was trained with --binary encoding')
+	parser.add_argument('--threshold', type=float, default=0.5,
+		metavar='<float>', help='minimum score reported [%(default)g]')
+	parser.add_argument('--batch', type=int, default=65536, metavar='<int>',
+		help='windows scored per batch [%(default)i]')
+	parser.add_argument('--threads', type=int, metavar='<int>',
+		help='torch threads [torch default]')
+	instrument.add_arguments(parser)
+	return parser
+
+def main_parser():
+	parser = argparse.ArgumentParser(
+		description='fun with neural networks')
+	parser.add_argument('pos', help='positive, real sequences')
+	parser.add_argument('neg', help='negative, fake sequences')
+	parser.add_argument('layers', type=int, nargs='*', metavar='<int>',
+		help='nodes in each hidden layer, e.g. 40 1 or 200 1')
+	parser.add_argument('--limit', type=int, metavar='<int>',
+		help='limit the data set size to this amount for testing')
+	parser.add_argument('--xvalid', type=int, default=2, metavar='<int>',
+		help='x-fold cross-validation [%(default)s]')
+	parser.add_argument('--rate', type=float, default=0.01,
+		metavar='<float>', help='learning rate [%(default)f]')
+	parser.add_argument('--momentum', type=float, default=0.9,
+		metavar='<float>', help='momentum [%(default)f]')
+	parser.add_argument('--seed', type=int, metavar='<int>',
+		help='set random seed')
+	parser.add_argument('--save', type=str, metavar='<path>',
+		help='where to save the model', default=None)
+	parser.add_argument('--binary', action='store_true',
+		help='2-bit binary encoding instead of one-hot')
+	parser.add_argument('--packed', action='store_true',
+		help='store encoded sequences bit-packed to save memory')
+	parser.add_argument('--batch', type=int, default=32, metavar='<int>',
+		help='training batch size [%(default)i]')
+	parser.add_argument('--eval-batch', type=int, default=1024, metavar='<int>',
+		help='batch size for validation and testing [%(default)i]')
+	parser.add_argument('--epochs', type=int, default=50, metavar='<int>',
+		help='maximum number of training epochs [%(default)i]')
+	parser.add_argument('--optimizer', choices=('sgd', 'adam'), default='sgd',
+		help='optimizer [%(default)s]')
+	parser.add_argument('--valid', type=float, default=0, metavar='<float>',
+		help='fraction of training data held out for early stopping '
+		'[%(default)g]')
+	parser.add_argument('--patience', type=int, default=5, metavar='<int>',
+		help='epochs without validation improvement before stopping '
+		'[%(default)i]')
+	parser.add_argument('--verbose', action='store_true',
+		help='report loss, time, and samples/sec for each epoch')
+	parser.add_argument('--jobs', type=int, metavar='<int>',
+		help='folds trained in parallel [smaller of --xvalid and CPUs]')
+	parser.add_argument('--threads', type=int, metavar='<int>',
+		help='torch threads per fold [CPUs / jobs]')
+	instrument.add_arguments(parser)
+	return parser
+
+def main(argv=None):
+	global network
+	if argv is None: argv = sys.argv[1:]
+	if argv[:1] == ['scan']:
+		arg = scan_parser().parse_args(argv[1:])
+		scan(arg, instrument.start(arg, 'mlp.py scan'))
+		return
+	arg = main_parser().parse_args(argv)
+	rec = instrument.start(arg, 'mlp.py')
+
+	# read sequence files and encode directly into arrays
+	with rec.phase('load'):
+		s1 = ntencoder(arg.pos, binary=arg.binary)
+		s0 = ntencoder(arg.neg, binary=arg.binary)
+	if arg.limit:
+		s1 = s1[:arg.limit]
+		s0 = s0[:arg.limit]
+	size = s1.shape[1] # number of inputs
+	rec.count(len(s1) + len(s0),
+		(len(s1) + len(s0)) * size // (2 if arg.binary else 4))
+
+	# check network architecture before torch is loaded
+	if len(arg.layers) < 2: raise Exception('need at least 2 layers')
+	if arg.layers[0] != size: raise Exception('input layer != inputs')
+	if arg.layers[-1] != 1: raise Exception('last layer must be 1')
+
+	with rec.phase('import'):
+		import torch
+		import network
+	if arg.seed: torch.manual_seed(arg.seed)
+	X = np.concatenate((s1, s0))
+	y = np.concatenate((np.ones(len(s1)), np.zeros(len(s0))))
+	order = torch.randperm(len(X)).numpy()
+	X, y = X[order], y[order]
+	if arg.packed:
+		dataset = network.SeqDataset(np.packbits(X, axis=1), y, width=size)
+	else:
+		dataset = network.SeqDataset(X, y)
+
+	# disjoint folds, or a single 75/25 split without cross-validation
+	if arg.xvalid > 1:
+		folds = list(cross_validation(np.arange(len(dataset)), arg.xvalid))
+	else:
+		train, test = dataset.get_splits(0.25)
+		folds = [(train.indices, test.indices)]
+	seeds = np.random.SeedSequence(arg.seed).generate_state(len(folds))
+	seeds = seeds.tolist()
+	cpus = os.cpu_count() or 1
+	jobs = arg.jobs or min(len(folds), cpus)
+	threads = arg.threads or max(1, cpus // jobs)
+
+	# train, test, evaluate model
+	opts = {name: getattr(arg, name) for name in ('rate', 'momentum', 'batch',
+		'eval_batch', 'epochs', 'optimizer', 'valid', 'patience', 'verbose')}
+	work = [(train, test, arg.layers, opts, seed)
+		for (train, test), seed in zip(folds, seeds)]
+	with rec.phase('train'):
+		if jobs > 1:
+			# spawn, not fork: torch is loaded and its thread pools are
+			# running, and a forked child can deadlock on their locks
+			with ProcessPoolExecutor(jobs, mp_context=get_context('spawn'),
+					initializer=network._init_worker,
+					initargs=(dataset, threads)) as pool:
+				accs, state = report_folds(pool.map(network.run_fold,
+					*zip(*work)))
+		else:
+			network._init_worker(dataset, threads)
+			accs, state = report_folds(network.run_fold(*w) for w in work)
+
+	with rec.phase('write'):
+		if arg.save != None: torch.save(state, arg.save)
+
+		# report aggregate performance
+		print(statistics.mean(accs))
+
+if __name__ == '__main__':
+	main()
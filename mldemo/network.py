@@ -0,0 +1,203 @@
+"""Torch side of mlp.py: datasets, the network, training, and evaluation
+
+mlp.py imports this module only once training or scanning starts, so that
+argument checks and sequence encoding don't pay for importing torch.
+"""
+
+import copy
+import math
+import sys
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from torch.utils.data import random_split
+from torch.nn import Linear
+from torch.nn import ReLU
+from torch.nn import Sigmoid
+from torch.nn import Module, ModuleList
+from torch.optim import SGD, Adam
+from torch.nn import BCELoss
+from torch.nn.init import kaiming_uniform_
+from torch.nn.init import xavier_uniform_
+
+import evaluate
+
+class SeqDataset(Dataset):
+
+	def __init__(self, X, y, width=None):
+		self.X = torch.from_numpy(X) # uint8, bit-packed if width is set
+		self.y = torch.from_numpy(y.astype('float32').reshape((len(y), 1)))
+		self.width = width
+
+	def __len__(self):
+		return len(self.X)
+
+	def __getitem__(self, idx):
+		x = self.X[idx]
+		if self.width is not None:
+			x = torch.from_numpy(np.unpackbits(x.numpy(), axis=-1,
+				count=self.width))
+		return [x.float(), self.y[idx]]
+
+	def get_splits(self, n_test):
+		test_size = round(n_test * len(self.X))
+		train_size = len(self.X) - test_size
+		return random_split(self, (train_size, test_size))
+
+class BatchLoader:
+	"""Yields whole batches from a SeqDataset by indexing its tensors"""
+
+	def __init__(self, dataset, indices, batch_size, shuffle=False):
+		self.dataset = dataset
+		self.indices = torch.as_tensor(indices, dtype=torch.long)
+		self.batch_size = batch_size
+		self.shuffle = shuffle
+
+	def __len__(self):
+		return math.ceil(len(self.indices) / self.batch_size)
+
+	def __iter__(self):
+		idx = self.indices
+		if self.shuffle: idx = idx[torch.randperm(len(idx))]
+		for i in range(0, len(idx), self.batch_size):
+			yield self.dataset[idx[i:i+self.batch_size]]
+
+class MLP(Module):
+
+	def __init__(self, n_inputs, layers):
+		super(MLP, self).__init__()
+
+		self.hidden = ModuleList()
+		self.act = ModuleList()
+		for i in range(1, len(layers)):
+			input = layers[i-1]
+			output = layers[i]
+			self.hidden.append(Linear(input, output))
+
+		for i in range(len(self.hidden) -1):
+			kaiming_uniform_(self.hidden[i].weight, nonlinearity='relu')
+			self.act.append(ReLU())
+		xavier_uniform_(self.hidden[-1].weight)
+		self.act.append(Sigmoid())
+
+	def forward(self, X):
+		for hidden, act in zip(self.hidden, self.act):
+			X = hidden(X)
+			X = act(X)
+		return X
+
+def train_model(train_dl, model, r, m, epochs=50, optimizer='sgd',
+		valid_dl=None, patience=5, verbose=False):
+	criterion = BCELoss() # or CrossEntropyLoss, MSELoss
+	if optimizer == 'adam': optimizer = Adam(model.parameters(), lr=r)
+	else:                   optimizer = SGD(model.parameters(), lr=r, momentum=m)
+	best = None
+	best_loss = math.inf
+	stale = 0
+	for epoch in range(epochs):
+		t0 = time.perf_counter()
+		n = 0
+		total = 0
+		for i, (inputs, targets) in enumerate(train_dl): # mini batches
+			optimizer.zero_grad() # clear the gradients
+			yhat = model(inputs) # compute the model output
+			loss = criterion(yhat, targets) # calculate loss
+			loss.backward() # credit assignment
+			optimizer.step() # update model weights
+			n += len(inputs)
+			total += loss.item() * len(inputs)
+		elapsed = time.perf_counter() - t0
+		msg = f'epoch {epoch+1}\tloss {total/n:.4f}\t{elapsed:.3f}s\t' \
+			f'{n/elapsed:.0f} samples/s'
+
+		# early stopping on validation loss, keeping the best weights
+		if valid_dl is not None:
+			with torch.no_grad():
+				vloss = sum(criterion(model(x), y).item() * len(x)
+					for x, y in valid_dl) / len(valid_dl.indices)
+			msg += f'\tvalid {vloss:.4f}'
+			if vloss < best_loss:
+				best_loss = vloss
+				best = copy.deepcopy(model.state_dict())
+				stale = 0
+			else:
+				stale += 1
+		if verbose: print(msg, file=sys.stderr, flush=True)
+		if valid_dl is not None and stale >= patience: break
+	if best is not None: model.load_state_dict(best)
+
+def evaluate_model(test_dl, model):
+	"""Returns accuracy, f1, and the evaluate.summary() of the test scores"""
+	predictions, actuals = list(), list()
+	for i, (inputs, targets) in enumerate(test_dl):
+		yhat = model(inputs) # evaluate the model on the test set
+		yhat = yhat.detach().numpy() # retrieve numpy array
+		actual = targets.numpy()
+		actual = actual.reshape((len(actual), 1))
+		predictions.append(yhat) # store
+		actuals.append(actual)
+
+	scores, actuals = np.vstack(predictions), np.vstack(actuals)
+	predictions = scores.round() # round to class values
+	acc = accuracy_score(actuals, predictions)
+	f1 = f1_score(actuals, predictions)
+	labels = actuals[:, 0] == 1
+	stats = evaluate.summary(scores[labels, 0], scores[~labels, 0])
+	return acc, f1, stats
+
+def accuracy_score(actuals, predictions):
+	return float(np.mean(actuals == predictions))
+
+def f1_score(actuals, predictions):
+	"""F1 of each class, averaged with weights by class support"""
+	f1 = 0
+	for c in np.unique(actuals):
+		tp = np.sum((predictions == c) & (actuals == c))
+		fp = np.sum((predictions == c) & (actuals != c))
+		fn = np.sum((predictions != c) & (actuals == c))
+		if tp: f1 += 2 * tp / (2 * tp + fp + fn) * np.mean(actuals == c)
+	return float(f1)
+
+def predict(rows, model):
+	"""Scores one encoded row or a 2D array of them"""
+	rows = torch.as_tensor(np.atleast_2d(rows), dtype=torch.float32)
+	with torch.inference_mode(): yhat = model(rows)
+	return yhat.numpy()
+
+_dataset = None
+
+def _init_worker(dataset, threads):
+	global _dataset
+	_dataset = dataset
+	torch.set_num_threads(threads)
+
+def run_fold(train, test, layers, opts, seed):
+	"""Trains and tests one fold, returns accuracy, f1, stats, and the model"""
+	torch.manual_seed(seed)
+	train = torch.as_tensor(train, dtype=torch.long)
+	valid_dl = None
+	if opts['valid'] > 0:
+		train = train[torch.randperm(len(train))]
+		n = round(opts['valid'] * len(train))
+		valid_dl = BatchLoader(_dataset, train[:n], opts['eval_batch'])
+		train = train[n:]
+	train_dl = BatchLoader(_dataset, train, opts['batch'], shuffle=True)
+	test_dl = BatchLoader(_dataset, test, opts['eval_batch'])
+	model = MLP(layers[0], layers)
+	train_model(train_dl, model, opts['rate'], opts['momentum'],
+		epochs=opts['epochs'], optimizer=opts['optimizer'], valid_dl=valid_dl,
+		patience=opts['patience'], verbose=opts['verbose'])
+	with torch.no_grad(): acc, f1, stats = evaluate_model(test_dl, model)
+	return acc, f1, stats, model.state_dict()
+
+def load_model(path):
+	"""Loads a saved state_dict, inferring the layers from its weights"""
+	state = torch.load(path)
+	weights = [state[f'hidden.{i}.weight'] for i in range(len(state) // 2)]
+	layers = [weights[0].shape[1]] + [w.shape[0] for w in weights]
+	model = MLP(layers[0], layers)
+	model.load_state_dict(state)
+	model.eval()
+	return model, layers
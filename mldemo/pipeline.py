@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""Cached, parallel runner for the run.sh workflow
+
+Each step of run.sh is a Stage that reads and writes named artifacts. A
+stage's key is a hash of its command (or function), its parameters, the
+source of the scripts and local modules it runs, and the keys of the stages
+it reads from (or the contents of input files). Outputs live in
+<cache>/<key>/, so a rerun only recomputes stages whose key changed, which
+after a one-parameter change means that stage and everything downstream.
+
+Stages whose inputs are ready run concurrently. Command stages run a script
+in their own directory and see their inputs as paths. Function stages are
+called in this process with the values of their inputs and are also pickled
+into the cache. Every step of run.sh is still a command stage, so the
+workflow's data moves between stages as files in the cache; only the final
+report is a function stage, reading the test outputs in memory.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+import instrument
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PLACEHOLDER = re.compile(r'\{([^{}]+)\}')
+IMPORT = re.compile(r'^\s*(?:import|from)\s+(\w+)', re.MULTILINE)
+
+def _sha(*parts):
+	h = hashlib.sha256()
+	for part in parts:
+		h.update(part if isinstance(part, bytes) else str(part).encode())
+		h.update(b'\0')
+	return h.hexdigest()
+
+def file_hash(path, block=1 << 22):
+	"""Returns the sha256 of a file's contents"""
+	h = hashlib.sha256()
+	with open(path, 'rb') as fp:
+		while True:
+			data = fp.read(block)
+			if not data: break
+			h.update(data)
+	return h.hexdigest()
+
+def source_hash(script, seen=None):
+	"""Returns a hash of a script and the local modules it imports"""
+	if seen is None: seen = {}
+	path = os.path.realpath(script)
+	if path in seen: return ''
+	with open(path, 'rb') as fp: text = fp.read()
+	seen[path] = hashlib.sha256(text).hexdigest()
+	folder = os.path.dirname(script)
+	for name in IMPORT.findall(text.decode()):
+		module = os.path.join(folder, f'{name}.py')
+		if os.path.exists(module): source_hash(module, seen)
+	return _sha(*sorted(seen.values()))
+
+class Stage:
+	"""A step that makes named outputs from named inputs
+
+	cmd is a list of arguments in which {name} is replaced by the path of an
+	artifact or the value of a parameter; a first argument ending in .py is
+	run with this Python from the script directory. With stdout set, the
+	command's output is saved as that artifact. func is called instead as
+	func(inputs, **params) and returns a dict of outputs: bytes are written
+	as files, anything else is pickled. options are extra arguments that
+	change how a command runs (e.g. --jobs) but not what it makes, so they
+	are left out of the key.
+	"""
+
+	def __init__(self, name, outputs, cmd=None, func=None, inputs=(),
+			stdout=None, params=None, options=()):
+		self.name = name
+		self.outputs = list(outputs)
+		self.cmd = cmd
+		self.options = list(options)
+		self.func = func
+		self.stdout = stdout
+		self.params = dict(params or {})
+		self.inputs = list(inputs)
+		for token in cmd or []:
+			for ref in PLACEHOLDER.findall(token):
+				if ref not in self.params and ref not in self.inputs:
+					self.inputs.append(ref)
+
+	def identity(self):
+		"""Returns what the key covers besides the inputs"""
+		if self.func is not None:
+			code = self.func.__code__
+			what = [self.func.__module__, self.func.__qualname__, code.co_code,
+				repr(code.co_consts)]
+		else:
+			what = list(self.cmd)
+			if what[0].endswith('.py'):
+				what.append(source_hash(os.path.join(HERE, what[0])))
+		return what + [self.stdout, sorted(self.outputs),
+			json.dumps(self.params, sort_keys=True)]
+
+class Pipeline:
+	"""A DAG of stages over artifacts, cached under a directory"""
+
+	def __init__(self, cache):
+		self.cache = os.path.abspath(cache)
+		self.stages = {}
+		self.producer = {} # artifact -> stage name
+		self.sources = {} # artifact -> external file
+		self.values = {} # artifact -> value computed in this run
+		self.keys = {}
+
+	def source(self, name, path):
+		self.sources[name] = os.path.abspath(path)
+
+	def add(self, stage):
+		if stage.name in self.stages:
+			raise ValueError(f'duplicate stage {stage.name}')
+		for out in stage.outputs:
+			if out in self.producer or out in self.sources:
+				raise ValueError(f'{out} is made twice')
+			self.producer[out] = stage.name
+		self.stages[stage.name] = stage
+		return stage
+
+	def deps(self, stage):
+		"""Returns the names of the stages a stage reads from"""
+		deps = []
+		for art in stage.inputs:
+			if art in self.producer: deps.append(self.producer[art])
+			elif art not in self.sources:
+				raise ValueError(f'{stage.name}: nothing makes {art}')
+		return deps
+
+	def order(self, targets=None):
+		"""Returns stages needed for targets (all if None), inputs first"""
+		names = list(self.stages) if not targets else []
+		for target in targets or []:
+			if target in self.stages: names.append(target)
+			elif target in self.producer: names.append(self.producer[target])
+			else: raise ValueError(f'unknown stage or artifact {target}')
+		done = []
+		state = {}
+		def visit(name):
+			if state.get(name) == 'done': return
+			if state.get(name) == 'open': raise ValueError(f'cycle at {name}')
+			state[name] = 'open'
+			for dep in self.deps(self.stages[name]): visit(dep)
+			state[name] = 'done'
+			done.append(self.stages[name])
+		for name in names: visit(name)
+		return done
+
+	def key(self, stage):
+		if stage.name not in self.keys:
+			parts = stage.identity()
+			for art in sorted(stage.inputs):
+				if art in self.sources:
+					parts.append((art, file_hash(self.sources[art])))
+				else:
+					producer = self.stages[self.producer[art]]
+					parts.append((art, self.key(producer)))
+			self.keys[stage.name] = _sha(*parts)
+		return self.keys[stage.name]
+
+	def path(self, art):
+		"""Returns the file holding an artifact"""
+		if art in self.sources: return self.sources[art]
+		stage = self.stages[self.producer[art]]
+		folder = os.path.join(self.cache, self.key(stage))
+		pkl = os.path.join(folder, art + '.pkl')
+		return pkl if os.path.exists(pkl) else os.path.join(folder, art)
+
+	def value(self, art):
+		"""Returns an artifact's value, from memory if made in this run"""
+		if art in self.values: return self.values[art]
+		path = self.path(art)
+		with open(path, 'rb') as fp:
+			if path.endswith('.pkl'): return pickle.load(fp)
+			return fp.read()
+
+	def cached(self, stage):
+		return os.path.exists(os.path.join(self.cache, self.key(stage)))
+
+	def execute(self, stage):
+		"""Runs one stage into a scratch directory, then moves it into place"""
+		final = os.path.join(self.cache, self.key(stage))
+		work = f'{final}.{os.getpid()}.tmp'
+		shutil.rmtree(work, ignore_errors=True)
+		os.makedirs(work)
+		t0 = time.perf_counter()
+		if stage.func is not None:
+			inputs = {art: self.value(art) for art in stage.inputs}
+			results = stage.func(inputs, **stage.params)
+			for art in stage.outputs:
+				value = results[art]
+				if isinstance(value, bytes):
+					with open(os.path.join(work, art), 'wb') as fp:
+						fp.write(value)
+				else:
+					with open(os.path.join(work, art + '.pkl'), 'wb') as fp:
+						pickle.dump(value, fp)
+				self.values[art] = value
+		else:
+			subst = {art: self.path(art) for art in stage.inputs}
+			subst.update({k: str(v) for k, v in stage.params.items()})
+			argv = [PLACEHOLDER.sub(lambda m: subst[m.group(1)], token)
+				for token in stage.cmd] + stage.options
+			if argv[0].endswith('.py'):
+				argv = [sys.executable, os.path.join(HERE, argv[0])] + argv[1:]
+			out = open(os.path.join(work, stage.stdout), 'wb') \
+				if stage.stdout else subprocess.DEVNULL
+			try:
+				proc = subprocess.run(argv, cwd=work, stdout=out,
+					stderr=subprocess.PIPE)
+			finally:
+				if stage.stdout: out.close()
+			if proc.returncode != 0:
+				raise RuntimeError(f'{stage.name} failed: {" ".join(argv)}\n'
+					+ proc.stderr.decode(errors='replace'))
+			for art in stage.outputs:
+				if not os.path.exists(os.path.join(work, art)):
+					raise RuntimeError(f'{stage.name} did not make {art}')
+		elapsed = time.perf_counter() - t0
+		with open(os.path.join(work, 'stage.json'), 'w') as fp:
+			json.dump({'stage': stage.name, 'cmd': stage.cmd,
+				'options': stage.options, 'params': stage.params,
+				'seconds': elapsed}, fp)
+		try:
+			os.rename(work, final)
+		except OSError: # made by someone else meanwhile
+			shutil.rmtree(work, ignore_errors=True)
+		return elapsed
+
+	def run(self, targets=None, jobs=1, log=sys.stderr):
+		"""Runs what is needed for targets, independent stages concurrently"""
+		os.makedirs(self.cache, exist_ok=True)
+		todo = self.order(targets)
+		finished = set()
+		running = {}
+		with ThreadPoolExecutor(jobs) as pool:
+			while todo or running:
+				for stage in list(todo):
+					deps = self.deps(stage)
+					if any(d not in finished for d in deps): continue
+					todo.remove(stage)
+					if self.cached(stage):
+						finished.add(stage.name)
+						print(stage.name, 'cached', self.key(stage)[:12],
+							sep='\t', file=log)
+					else:
+						running[pool.submit(self.execute, stage)] = stage
+				if not running: continue
+				done, _ = wait(running, return_when=FIRST_COMPLETED)
+				for future in done:
+					stage = running.pop(future)
+					elapsed = future.result() # raises if the stage failed
+					finished.add(stage.name)
+					print(stage.name, 'ran', f'{elapsed:.2f}s', sep='\t',
+						file=log)
+
+
+##############
+## Workflow ##
+##############
+
+def report(inputs):
+	"""Collects the accuracy of every tester run into one table"""
+	lines = []
+	for name in sorted(inputs):
+		text = inputs[name].decode()
+		acc = re.findall(r'^Accuracy: (\S+)', text, re.MULTILINE)
+		if acc: value = acc[0]
+		else:   value = text.split()[-1] if text.split() else 'NA'
+		lines.append(f'{name}\t{value}\n')
+	return {'report.txt': ''.join(lines).encode()}
+
+def workflow(pipe, arg):
+	"""Adds the stages of run.sh to a pipeline"""
+	seed = {'seed': arg.seed}
+	pipe.add(Stage('splices', ['don.txt', 'acc.txt'],
+		['splices.py', '{introns}', '--limit', '{limit}', '--seed', '{seed}'],
+		params={'limit': arg.limit, **seed}))
+	tests = []
+	mlps = []
+	width = 4 * arg.size
+	for site, flag in (('don', '--donor'), ('acc', '--acceptor')):
+		pipe.add(Stage(f'{site}.split', [f'{site}.0.txt', f'{site}.1.txt'],
+			['splitter.py', f'{{{site}.txt}}', '2', site]))
+		pipe.add(Stage(f'{site}.pwm', [f'{site}.0.pwm'],
+			['pwm-maker.py', f'{{{site}.0.txt}}'], stdout=f'{site}.0.pwm'))
+		fakes = {
+			'random': ['random-splices.py', '{n}', '{size}', flag,
+				'--seed', '{seed}'],
+			'decoy': ['decoy-splices.py', '{introns}', '{n}', '{size}', flag,
+				'--seed', '{seed}'],
+		}
+		for fake, cmd in fakes.items():
+			name = f'{site}.{fake}'
+			pipe.add(Stage(name, [f'{name}.txt'], cmd, stdout=f'{name}.txt',
+				params={'n': arg.fakes, 'size': arg.size, **seed}))
+			pipe.add(Stage(f'{name}.split', [f'{name}.0.txt', f'{name}.1.txt'],
+				['splitter.py', f'{{{name}.txt}}', '2', name]))
+			pipe.add(Stage(f'{name}.pwm', [f'{name}.0.pwm'],
+				['pwm-maker.py', f'{{{name}.0.txt}}'], stdout=f'{name}.0.pwm'))
+			pipe.add(Stage(f'test.{name}', [f'test.{name}.txt'],
+				['pwm-tester.py', f'{{{site}.0.pwm}}', f'{{{name}.0.pwm}}',
+				f'{{{site}.1.txt}}', f'{{{name}.1.txt}}'],
+				stdout=f'test.{name}.txt'))
+			tests.append(f'test.{name}.txt')
+			mlps.append((f'mlp.{name}', f'{site}.txt', f'{name}.txt',
+				[width, 1]))
+		mlps.append((f'mlp.{site}.random.deep', f'{site}.txt',
+			f'{site}.random.txt', [width, 10, 1]))
+
+	for kind, source, extra in (('exons', 'cds', []),
+			('introns', 'introns', ['--introns'])):
+		pipe.add(Stage(kind, [f'{kind}.txt'],
+			['exon-intron.py', f'{{{source}}}', '{n}', '--seed', '{seed}']
+			+ extra, stdout=f'{kind}.txt', params={'n': arg.windows, **seed}))
+		pipe.add(Stage(f'{kind}.split', [f'{kind}.0.txt', f'{kind}.1.txt'],
+			['splitter.py', f'{{{kind}.txt}}', '2', kind]))
+	model = f'exon-vs-intron.{arg.k}.kmer'
+	pipe.add(Stage('kmer', [model], ['kmer-maker.py', '{exons.0.txt}',
+		'{introns.0.txt}', '{k}'], stdout=model, params={'k': arg.k}))
+	pipe.add(Stage('test.kmer', ['test.kmer.txt'], ['kmer-tester.py',
+		f'{{{model}}}', '{exons.1.txt}', '{introns.1.txt}'],
+		stdout='test.kmer.txt'))
+	tests.append('test.kmer.txt')
+	mlps.append(('mlp.exon-intron', 'exons.txt', 'introns.txt', [200, 1]))
+	mlps.append(('mlp.exon-intron.deep', 'exons.txt', 'introns.txt',
+		[200, 20, 1]))
+
+	# each mlp.py gets its share of the CPUs for its folds (2 by default),
+	# since up to --jobs of them run at once
+	budget = max(1, (os.cpu_count() or 1) // arg.jobs)
+	folds = min(2, budget)
+	cpu = ['--jobs', str(folds), '--threads', str(max(1, budget // folds))]
+	if not arg.no_mlp:
+		for name, pos, neg, layers in mlps:
+			pipe.add(Stage(name, [f'{name}.txt'], ['mlp.py', f'{{{pos}}}',
+				f'{{{neg}}}', *map(str, layers), '--seed', '{seed}'],
+				stdout=f'{name}.txt', params=seed, options=cpu))
+			tests.append(f'{name}.txt')
+
+	pipe.add(Stage('report', ['report.txt'], func=report, inputs=tests))
+
+
+#########
+## CLI ##
+#########
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(
+		description='run the run.sh workflow with caching and parallel stages')
+	parser.add_argument('introns', help='intron fasta, e.g. introns.fa.gz')
+	parser.add_argument('cds', help='coding sequence fasta, e.g. cds.fa.gz')
+	parser.add_argument('targets', nargs='*',
+		help='stages or artifacts to make [all]')
+	parser.add_argument('--cache', default='.pipeline', metavar='<path>',
+		help='cache directory [%(default)s]')
+	parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+		metavar='<int>', help='stages run at once [%(default)i]')
+	parser.add_argument('--seed', type=int, default=1, metavar='<int>',
+		help='random seed passed to every stage that takes one [%(default)i]')
+	parser.add_argument('--limit', type=int, default=20000, metavar='<int>',
+		help='splice sites kept by splices.py [%(default)i]')
+	parser.add_argument('--size', type=int, default=10, metavar='<int>',
+		help='length of splice sites [%(default)i]')
+	parser.add_argument('--fakes', type=int, default=20000, metavar='<int>',
+		help='random and decoy sites made [%(default)i]')
+	parser.add_argument('--windows', type=int, default=20000, metavar='<int>',
+		help='exon and intron windows made [%(default)i]')
+	parser.add_argument('--k', type=int, default=4, metavar='<int>',
+		help='kmer size of the exon-intron model [%(default)i]')
+	parser.add_argument('--no-mlp', action='store_true',
+		help='skip the (slow) neural network stages')
+	parser.add_argument('--export', metavar='<path>',
+		help='copy every artifact made into this directory')
+	instrument.add_arguments(parser)
+	arg = parser.parse_intermixed_args(argv)
+	rec = instrument.start(arg, 'pipeline.py')
+
+	pipe = Pipeline(arg.cache)
+	pipe.source('introns', arg.introns)
+	pipe.source('cds', arg.cds)
+	workflow(pipe, arg)
+	with rec.phase('run'): pipe.run(arg.targets, arg.jobs)
+	rec.count(len(pipe.order(arg.targets)))
+
+	with rec.phase('write'):
+		if arg.export:
+			os.makedirs(arg.export, exist_ok=True)
+			for stage in pipe.order(arg.targets):
+				for art in stage.outputs:
+					shutil.copy(pipe.path(art), os.path.join(arg.export, art))
+		if not arg.targets or 'report' in arg.targets:
+			sys.stdout.write(pipe.value('report.txt').decode())
+
+if __name__ == '__main__':
+	main()
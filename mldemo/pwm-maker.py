@@ -1,30 +1,48 @@
 import argparse
-import re
-import korflab
-
-def init_pwm(seq):
-	pwm = []
-	for _ in seq:
-		pwm.append({'A':0, 'C':0, 'G':0, 'T':0})
-	return pwm
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+import instrument
+import pwm
 
 parser = argparse.ArgumentParser()
-parser.add_argument('seqs', help='file of sequences')
+parser.add_argument('seqs', nargs='+', help='file(s) of sequences')
+parser.add_argument('--pseudo', type=float, default=0, metavar='<float>',
+	help='pseudo-count added to each nucleotide at each position '
+	'[%(default)g]')
+parser.add_argument('--background', metavar='<pwm>',
+	help='report log2 odds against this pwm instead of probabilities')
+parser.add_argument('--jobs', type=int, default=1, metavar='<int>',
+	help='number of files counted in parallel [%(default)i]')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
+
+with rec.phase('count'):
+	if arg.jobs > 1 and len(arg.seqs) > 1:
+		with ProcessPoolExecutor(arg.jobs, mp_context=get_context('fork')) \
+				as pool:
+			parts = list(pool.map(pwm.count_file, arg.seqs))
+	else:
+		parts = [pwm.count_file(file) for file in arg.seqs]
 
-pwm = None
-total = 0
+parts = [p for p in parts if p is not None]
+if not parts: sys.exit('no sequences')
+if len(set(p.shape for p in parts)) > 1: sys.exit('sequences differ in length')
+counts = sum(parts)
+rec.count(int(counts[:, 0].sum()), int(counts.sum()))
+counts = counts + arg.pseudo
+total = counts[:, 0].sum()
+prob = counts / total
 
-with open(arg.seqs) as fp:
-	for line in fp:
-		seq = line.rstrip()
-		if not re.search('^[ACGT]+$', seq): continue
-		if pwm is None: pwm = init_pwm(seq)
-		total += 1
-		for i, nt in enumerate(seq):
-			pwm[i][nt] += 1
+if arg.background:
+	bg = pwm.read_pwm(arg.background)
+	if bg.shape != prob.shape: sys.exit('background pwm differs in length')
+	prob = np.log2(np.maximum(prob, pwm.FLOOR) / np.maximum(bg, pwm.FLOOR))
 
-for d in pwm:
-	for k, v in d.items():
-		print(f'{v/total:.4f}', end='\t')
-	print()
+with rec.phase('write'):
+	for column in prob.T.tolist():
+		for v in column:
+			print(f'{v:.4f}', end='\t')
+		print()
@@ -0,0 +1,39 @@
+import argparse
+import sys
+import korflab
+import instrument
+import seqio
+import kmers
+import pwm
+
+parser = argparse.ArgumentParser(
+	description='scan sequences for windows that score well with a PWM')
+parser.add_argument('truepwm', help='pwm generated from real observations')
+parser.add_argument('fakepwm', help='pwm generated from fake/decoy sites')
+parser.add_argument('fasta', help='sequences to scan, e.g. a genome')
+parser.add_argument('--threshold', type=float, default=0, metavar='<float>',
+	help='minimum log-odds score reported [%(default)g]')
+parser.add_argument('--top', type=int, metavar='<int>',
+	help='report only the N best windows of each sequence and strand')
+parser.add_argument('--both', action='store_true',
+	help='also scan the reverse strand')
+instrument.add_arguments(parser)
+arg = parser.parse_args()
+rec = instrument.start(arg)
+
+with rec.phase('load'):
+	lod = pwm.logodds(pwm.read_pwm(arg.truepwm), pwm.read_pwm(arg.fakepwm))
+L = lod.shape[1]
+threshold = None if arg.top else arg.threshold
+
+with rec.phase('score'):
+	for name, seq in rec.tally(seqio.readfasta(arg.fasta, text=True)):
+		name = name.split()[0]
+		strands = [('+', seq)]
+		if arg.both: strands.append(('-', korflab.anti(seq)))
+		for strand, s in strands:
+			pos, scores = pwm.scan(lod, kmers.encode(s), threshold, arg.top)
+			if strand == '-': pos, scores = len(s) - pos[::-1] - L, scores[::-1]
+			sys.stdout.write(''.join(
+				f'{name}\t{b}\t{b+L}\t.\t{v:.3f}\t{strand}\n'
+				for b, v in zip(pos.tolist(), scores.tolist())))
@@ -1,57 +1,33 @@
 import argparse
-import korflab
-
-def readseq(file):
-	with open(file) as fp:
-		for line in fp: yield line.rstrip()
-
-def readpwm(file):
-	alph = 'ACGT'
-	pwm = []
-	with open(file) as fp:
-		for line in fp:
-			d = {}
-			f = line.split()
-			for nt, v in zip(alph, f):
-				d[nt] = float(v)
-			pwm.append(d)
-	return pwm
-
-def score_pwm(pwm, seq):
-	s = 1
-	for i, nt in enumerate(seq):
-		if nt not in pwm[i]: continue
-		s *= pwm[i][nt]
-	return s
+import instrument
+import pwm
+import evaluate
 
 parser = argparse.ArgumentParser()
 parser.add_argument('truepwm', help='pwm generated from real observations')
 parser.add_argument('fakepwm', help='pwm generated from fake/decoy sites')
 parser.add_argument('trueseq', help='true sites')
 parser.add_argument('fakeseq', help='fake sites')
+parser.add_argument('--threshold', type=float, default=0, metavar='<float>',
+	help='true site if log-odds score is greater than this [%(default)g]')
+parser.add_argument('--curve', metavar='<path>',
+	help='write ROC and precision-recall points to this file')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
-
-tpwm = readpwm(arg.truepwm)
-fpwm = readpwm(arg.fakepwm)
-
-tp = 0
-fp = 0
-tn = 0
-fn = 0
-for seq in readseq(arg.trueseq):
-	true_score = score_pwm(tpwm, seq)
-	fake_score = score_pwm(fpwm, seq)
-	if true_score > fake_score: tp += 1
-	else:                       fn += 1
-
-for seq in readseq(arg.fakeseq):
-	true_score = score_pwm(tpwm, seq)
-	fake_score = score_pwm(fpwm, seq)
-	if true_score > fake_score: fp += 1
-	else:                       tn += 1
-
-print('True Positives:', tp)
-print('True Negatives:', tn)
-print('False Positives:', fp)
-print('False Negatives:', fn)
-print('Accuracy:', (tp+tn) / (tp+tn+fp+fn))
+rec = instrument.start(arg)
+
+with rec.phase('load'):
+	tpwm = pwm.read_pwm(arg.truepwm)
+	fpwm = pwm.read_pwm(arg.fakepwm)
+	lod = pwm.logodds(tpwm, fpwm)
+	L = lod.shape[1]
+	tsites = pwm.read_sites(arg.trueseq, L)
+	fsites = pwm.read_sites(arg.fakeseq, L)
+rec.count(len(tsites) + len(fsites), tsites.size + fsites.size)
+
+# true site if it scores higher with the true pwm than the fake one
+with rec.phase('score'):
+	tscores = pwm.score_sites(lod, tsites)
+	fscores = pwm.score_sites(lod, fsites)
+with rec.phase('write'):
+	evaluate.report(tscores, fscores, arg.threshold, arg.curve)
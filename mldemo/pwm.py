@@ -0,0 +1,122 @@
+"""Vectorized position weight matrix scoring
+
+A PWM is held as a 4 x L array (rows A, C, G, T). Scoring uses a log-odds
+matrix log2(true/fake) with an extra row of zeros, so that positions with a
+non-ACGT code (4 in kmers.encode) contribute nothing, as before. Scores are
+gathered for all sites or windows at once and summed over positions.
+
+count_file() builds PWM counts from a file of fixed-width sites, reading it
+in large chunks and counting each column with bincount.
+"""
+
+import numpy as np
+import kmers
+
+FLOOR = 1e-4 # pwm-maker.py reports 4 decimals, so 0 means < 0.0001
+
+def read_pwm(file):
+	"""Reads pwm-maker.py output into a 4 x L array of probabilities"""
+	rows = []
+	with open(file) as fp:
+		for line in fp:
+			f = line.split()
+			if f: rows.append([float(v) for v in f[:4]])
+	return np.array(rows).T
+
+def logodds(true, fake, floor=FLOOR):
+	"""Returns a 5 x L log-odds matrix, the last row being 0 for non-ACGT"""
+	if true.shape != fake.shape: raise ValueError('PWMs differ in shape')
+	lod = np.log2(np.maximum(true, floor) / np.maximum(fake, floor))
+	return np.vstack((lod, np.zeros(lod.shape[1])))
+
+def _chunks(file, size):
+	"""Yields chunks of a file that end on a line boundary"""
+	with open(file, 'rb') as fp:
+		rest = b''
+		while True:
+			data = fp.read(size)
+			if not data: break
+			data = rest + data
+			end = data.rfind(b'\n') + 1
+			rest = data[end:]
+			if end: yield data[:end]
+		if rest: yield rest + b'\n'
+
+def _rows(chunk, width):
+	"""Returns an n x width byte matrix of the lines of a chunk"""
+	buf = np.frombuffer(chunk, dtype=np.uint8)
+	if width and len(buf) % (width + 1) == 0:
+		rows = buf.reshape(-1, width + 1)
+		if np.all(rows[:, -1] == ord('\n')): return rows[:, :width]
+	lines = [line for line in chunk.split() if len(line) == width]
+	return np.frombuffer(b''.join(lines), dtype=np.uint8).reshape(-1, width)
+
+def count_file(file, width=None, chunk=1 << 24):
+	"""Returns a 4 x L array counting nucleotides at each position
+
+	Sites with non-ACGT characters are skipped, as are lines of a different
+	length than the first site (or width, if given).
+	"""
+	counts = None
+	for data in _chunks(file, chunk):
+		if width is None:
+			for line in data.split():
+				if np.all(kmers.encode(line) < 4):
+					width = len(line)
+					break
+			if width is None: continue
+		codes = kmers.LOOKUP[_rows(data, width)]
+		codes = codes[np.all(codes < 4, axis=1)]
+		flat = codes.astype(np.int64) * width + np.arange(width)
+		n = np.bincount(flat.ravel(), minlength=4 * width).reshape(4, width)
+		counts = n if counts is None else counts + n
+	return counts
+
+def read_sites(file, length=None):
+	"""Reads a file of fixed-length sites into an n x L array of codes"""
+	with open(file, 'rb') as fp:
+		seqs = fp.read().split()
+	if length is None: length = len(seqs[0]) if seqs else 0
+	if any(len(seq) != length for seq in seqs):
+		raise ValueError(f'{file}: sites are not all {length} long')
+	return kmers.encode(b''.join(seqs)).reshape(len(seqs), length)
+
+def score_sites(lod, codes):
+	"""Returns the log-odds score of each row of an n x L code array"""
+	return lod[codes, np.arange(lod.shape[1])].sum(axis=1)
+
+def score_windows(lod, codes):
+	"""Returns the score of every window of a 1D code array"""
+	L = lod.shape[1]
+	n = len(codes) - L + 1
+	if n <= 0: return np.zeros(0)
+	scores = np.zeros(n)
+	for j in range(L): scores += lod[codes[j:j+n], j]
+	return scores
+
+def scan(lod, codes, threshold=None, top=None, chunk=1 << 22):
+	"""Returns (positions, scores) of windows above threshold or the top N"""
+	L = lod.shape[1]
+	pos = []
+	val = []
+	for beg in range(0, max(len(codes) - L + 1, 0), chunk):
+		scores = score_windows(lod, codes[beg:beg + chunk + L - 1])
+		if threshold is not None:
+			keep = np.flatnonzero(scores >= threshold)
+		else:
+			keep = np.arange(len(scores))
+		if top is not None and len(keep) > top:
+			keep = keep[np.argpartition(scores[keep], -top)[-top:]]
+		pos.append(keep + beg)
+		val.append(scores[keep])
+		if top is not None: # keep only the running top N
+			pos = [np.concatenate(pos)]
+			val = [np.concatenate(val)]
+			if len(val[0]) > top:
+				best = np.argpartition(val[0], -top)[-top:]
+				pos, val = [pos[0][best]], [val[0][best]]
+	if not pos: return np.zeros(0, dtype=np.int64), np.zeros(0)
+	pos = np.concatenate(pos)
+	val = np.concatenate(val)
+	order = np.argsort(pos)
+	return pos[order], val[order]
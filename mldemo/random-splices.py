@@ -1,5 +1,7 @@
 import argparse
+import random
 import korflab
+import instrument
 
 parser = argparse.ArgumentParser()
 parser.add_argument('seqs', type=int, help='number of sequences to generate')
@@ -8,14 +10,21 @@ parser.add_argument('--donor', action='store_true',
 	help='start with GT...')
 parser.add_argument('--acceptor', action='store_true',
 	help='end with ...AG')
+parser.add_argument('--seed', type=int, metavar='<int>',
+	help='set random seed')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
+random.seed(arg.seed)
 
-for _ in range(arg.seqs):
-	size = arg.size
-	if arg.donor: size -= 2
-	if arg.acceptor: size -= 2
-	seq = korflab.random_dna(size)
-	if arg.donor: seq = 'GT' + seq
-	if arg.acceptor: seq = seq + 'AG'
-	print(seq)
+with rec.phase('write'):
+	for _ in range(arg.seqs):
+		size = arg.size
+		if arg.donor: size -= 2
+		if arg.acceptor: size -= 2
+		seq = korflab.random_dna(size)
+		if arg.donor: seq = 'GT' + seq
+		if arg.acceptor: seq = seq + 'AG'
+		print(seq)
+rec.count(arg.seqs, arg.seqs * arg.size)
 	
\ No newline at end of file
@@ -0,0 +1 @@
+../imeter/seqio.py
\ No newline at end of file
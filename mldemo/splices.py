@@ -1,7 +1,8 @@
 import argparse
 import random
 import re
-import korflab
+import instrument
+import seqio
 
 parser = argparse.ArgumentParser()
 parser.add_argument('fasta', help='intron file')
@@ -13,26 +14,33 @@ parser.add_argument('--length', type=int, default=10,
 	help='length of site [%(default)i]')
 parser.add_argument('--limit', type=int,
 	help='limit the number of sequences output')
+parser.add_argument('--seed', type=int, metavar='<int>',
+	help='set random seed')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
+random.seed(arg.seed)
 
 acc = []
 don = []
-for defline, seq in korflab.readfasta(arg.fasta):
-	if not re.match('^[ACGT]+$', seq): continue
-	d = seq[:arg.length]
-	a = seq[-arg.length:]
-	if d.startswith('GT'): don.append(d)
-	if a.endswith('AG'): acc.append(a)
+with rec.phase('parse'):
+	for defline, seq in rec.tally(seqio.readfasta(arg.fasta, text=True)):
+		if not re.match('^[ACGT]+$', seq): continue
+		d = seq[:arg.length]
+		a = seq[-arg.length:]
+		if d.startswith('GT'): don.append(d)
+		if a.endswith('AG'): acc.append(a)
 
 random.shuffle(acc)
 random.shuffle(don)
 
-with open(arg.acc, 'w') as afp:
-	for i, a in enumerate(acc):
-		if arg.limit and i == arg.limit: break
-		print(a, file=afp)
+with rec.phase('write'):
+	with open(arg.acc, 'w') as afp:
+		for i, a in enumerate(acc):
+			if arg.limit and i == arg.limit: break
+			print(a, file=afp)
 
-with open(arg.don, 'w') as dfp:
-	for i, d in enumerate(don):
-		if arg.limit and i == arg.limit: break
-		print(d, file=dfp)
+	with open(arg.don, 'w') as dfp:
+		for i, d in enumerate(don):
+			if arg.limit and i == arg.limit: break
+			print(d, file=dfp)
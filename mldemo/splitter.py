@@ -1,14 +1,20 @@
 import argparse
-import korflab
+import folds
+import instrument
 
 parser = argparse.ArgumentParser()
-parser.add_argument('seqs', help='file of sequences')
+parser.add_argument('seqs', help='file of sequences (lines or fasta)')
 parser.add_argument('splits', type=int, help='number of files to make')
 parser.add_argument('name', help='file prefix')
+parser.add_argument('--mode', choices=folds.MODES, default='round-robin',
+	help='how sequences are assigned to files [%(default)s]')
+parser.add_argument('--seed', type=int, metavar='<int>',
+	help='set random seed, or the hash key with --mode hash')
+instrument.add_arguments(parser)
 arg = parser.parse_args()
+rec = instrument.start(arg)
 
-for i in range(arg.splits):
-	with open(arg.seqs) as fp, open(f'{arg.name}.{i}.txt', 'w') as ofp:
-		for j, line in enumerate(fp):
-			if i == j % arg.splits: print(line, end='', file=ofp)
-		
+ext = 'fa' if folds.is_fasta(arg.seqs) else 'txt'
+outputs = [f'{arg.name}.{i}.{ext}' for i in range(arg.splits)]
+with rec.phase('split'):
+	rec.count(sum(folds.split(arg.seqs, outputs, arg.mode, arg.seed)))